@@ -0,0 +1,63 @@
+"""
+Startup cost with and without the binary alignment cache.
+
+Writes a random alignment, then times parsing it (cold), parsing it and writing the cache (build), and loading it
+from the cache (warm).
+
+    python -m benchmarks.alignment_cache -N 2000 -L 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+from classes import AlignmentCache, AlignmentParser
+from .synthetic import random_sequences
+
+
+def timed(function, repeat: int) -> float:
+    """
+    :return: best of repeat runs, in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-N', type=int, default=2000, help='number of sequences')
+    parser.add_argument('-L', type=int, default=5000, help='alignment length')
+    parser.add_argument('--width', type=int, default=60, help='line width of the wrapped sequences, 0 for none')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'random.aln')
+        cache = AlignmentCache.default_path(path)
+        with open(path, 'w') as file:
+            for name, sequence in random_sequences(args.N, args.L):
+                width = args.width or len(sequence)
+                file.write(f'>{name}\n')
+                file.writelines(sequence[i:i + width] + '\n' for i in range(0, len(sequence), width))
+
+        def build() -> None:
+            if os.path.exists(cache):
+                os.remove(cache)
+            AlignmentParser(path, cache=cache)
+
+        cold = timed(lambda: AlignmentParser(path), args.repeat)
+        built = timed(build, args.repeat)
+        warm = timed(lambda: AlignmentParser(path, cache=cache), args.repeat)
+
+        print(f'N={args.N} L={args.L}\tinput {os.path.getsize(path) / 2 ** 20:.1f} MiB\t'
+              f'cache {os.path.getsize(cache) / 2 ** 20:.1f} MiB')
+        print(f'cold (parse)       \t{cold:8.3f}s')
+        print(f'build (parse+write)\t{built:8.3f}s')
+        print(f'warm (memmap)      \t{warm:8.3f}s\t{cold / warm:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
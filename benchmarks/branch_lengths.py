@@ -0,0 +1,56 @@
+"""
+Time of Tree.calculate_branch_length on large random trees.
+
+The topology is built by joining random pairs of subtrees, which is enough to exercise every distance and the
+redistribution of negative lengths without running the join loop.
+
+    python -m benchmarks.branch_lengths -N 50000 -L 100
+"""
+import argparse
+import random
+import time
+from classes import Node, Tree
+from .synthetic import random_nodes
+
+
+def random_tree(N: int, L: int, seed: int = 0) -> Tree:
+    """
+    Tree over random leaves with a random topology
+    """
+    rng = random.Random(seed)
+    leaves = random_nodes(N, L, 0.3, seed)
+    tree = Tree(leaves, 1, N)
+
+    active = list(leaves)
+    while len(active) > 1:
+        i, j = rng.sample(range(len(active)), 2)
+        joined = Node("", "", is_leaf=False, store=tree.store)
+        for child in (active[i], active[j]):
+            joined.add_child(child)
+            child.parent = joined
+        joined.recompute_profile()
+        tree.nodes.append(joined)
+
+        active[i] = joined
+        active[j] = active[-1]
+        active.pop()
+
+    tree.root = active[0]
+    return tree
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-N', type=int, nargs='*', default=[5000, 50000], help='number of leaves')
+    parser.add_argument('-L', type=int, default=100, help='alignment length')
+    args = parser.parse_args()
+
+    for N in args.N:
+        tree = random_tree(N, args.L)
+        start = time.perf_counter()
+        tree.calculate_branch_length()
+        print(f'N={N} L={args.L}\t{time.perf_counter() - start:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Scaling of the join loop with the number of sequences.
+
+Times Tree.construct_initial_topology on random alignments of growing size, after the top hits are set, and reports
+the number of top-hits refreshes and the exponent of the growth in time between consecutive sizes. Every join computes
+O(m) distances to top hits, so with m = sqrt(N) the exponent is about 1.5. With a fixed m the loop should grow close to
+linearly, a join only visits the nodes that pointed at the joined nodes.
+
+    python -m benchmarks.join_loop 1000 2000 4000 8000 -L 100 -m 10
+"""
+from __future__ import annotations
+import argparse
+import math
+import time
+from classes import Tree
+from .synthetic import random_nodes
+
+
+def join_loop(N: int, L: int, m: int | None, refresh_ratio: float) -> tuple[float, int]:
+    """
+    :return: seconds spent in construct_initial_topology and the number of top-hits refreshes
+    """
+    nodes = random_nodes(N, L)
+    tree = Tree(nodes, m if m is not None else round(math.sqrt(N)), N, L, refresh_ratio=refresh_ratio)
+    tree.set_top_hits()
+
+    start = time.perf_counter()
+    tree.construct_initial_topology()
+    return time.perf_counter() - start, tree.refreshes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('N', type=int, nargs='*', default=[500, 1000, 2000, 4000])
+    parser.add_argument('-L', type=int, default=100, help='alignment length of the random alignments')
+    parser.add_argument('-m', type=int, help='length of the top-hits lists, the square root of N if not given')
+    parser.add_argument('--refresh', type=float, default=0.8, help='refresh ratio of the top hits')
+    args = parser.parse_args()
+
+    previous = None
+    for N in args.N:
+        seconds, refreshes = join_loop(N, args.L, args.m, args.refresh)
+        exponent = '' if previous is None else \
+            f'\texponent {math.log(seconds / previous[1]) / math.log(N / previous[0]):5.2f}'
+        print(f'{f"join loop N={N} L={args.L}":32}\t{seconds:8.3f}s\t{refreshes:6} of {N - 1} joins refreshed'
+              f'{exponent}')
+        previous = N, seconds
+
+
+if __name__ == '__main__':
+    main()
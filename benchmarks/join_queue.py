@@ -0,0 +1,96 @@
+"""
+Throughput of the join loop.
+
+Times Tree.construct_initial_topology on the bundled alignments and on random alignments, and replays the queue
+traffic of a join loop (every join pops two nodes, pushes the joined node and requeues a few nodes whose best known
+join changed) on queue.PriorityQueue and on the heap based JoinQueue.
+
+    python -m benchmarks.join_queue --synthetic 5000 20000 -L 200
+"""
+import argparse
+import glob
+import math
+import random
+import time
+from queue import PriorityQueue
+from classes import AlignmentParser, Node, ProfileStore, Tree
+from .synthetic import random_nodes
+
+
+def join_loop(nodes: list[Node]) -> tuple[float, int]:
+    """
+    :return: seconds spent in construct_initial_topology and the number of joins
+    """
+    tree = Tree(nodes, round(math.sqrt(len(nodes))), len(nodes))
+    tree.set_top_hits()
+
+    start = time.perf_counter()
+    tree.construct_initial_topology()
+    return time.perf_counter() - start, tree.joins
+
+
+def queue_traffic(N: int, updates: int) -> tuple[float, float]:
+    """
+    :return: seconds for the replay on PriorityQueue and on JoinQueue
+    """
+    from classes import JoinQueue
+
+    def pop_active(queue) -> Node:
+        # the old join loop skipped inactive nodes by hand, JoinQueue skips them itself
+        node = queue.get() if isinstance(queue, PriorityQueue) else queue.pop()
+        while not node.is_active:
+            node = queue.get()
+        return node
+
+    timings = []
+    for queue in (PriorityQueue(), JoinQueue()):
+        put = queue.put if isinstance(queue, PriorityQueue) else queue.push
+        store = ProfileStore.for_leaves(N, 1)
+        rng = random.Random(0)
+        active = [Node(str(i), "A", store=store) for i in range(N)]
+        for node in active:
+            node.best_known.distance = rng.random()
+            put(node)
+
+        start = time.perf_counter()
+        for _ in range(N - 1):
+            for _ in range(2):
+                node = pop_active(queue)
+                node.is_active = False
+            joined = Node("", "", is_leaf=False, store=store)
+            joined.best_known.distance = rng.random()
+            put(joined)
+            active.append(joined)
+            for _ in range(updates):
+                node = rng.choice(active)
+                if node.is_active:
+                    node.best_known.distance = rng.random()
+                    put(node)
+        timings.append(time.perf_counter() - start)
+
+    return timings[0], timings[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, nargs='*', default=[500, 1000])
+    parser.add_argument('-L', type=int, default=200, help='alignment length of the random alignments')
+    parser.add_argument('--traffic', type=int, nargs='*', default=[5000, 20000, 100000])
+    parser.add_argument('--updates', type=int, default=4, help='requeued nodes per join in the replay')
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob('resources/*.aln')):
+        seconds, joins = join_loop(AlignmentParser(path).get_data())
+        print(f'{path:32}\t{seconds:8.3f}s\t{joins / seconds:10.0f} joins/s')
+
+    for N in args.synthetic:
+        seconds, joins = join_loop(random_nodes(N, args.L))
+        print(f'{f"random N={N} L={args.L}":32}\t{seconds:8.3f}s\t{joins / seconds:10.0f} joins/s')
+
+    for N in args.traffic:
+        priority_queue, join_queue = queue_traffic(N, args.updates)
+        print(f'{f"queue traffic N={N}":32}\tPriorityQueue {priority_queue:8.3f}s\tJoinQueue {join_queue:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
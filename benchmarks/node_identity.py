@@ -0,0 +1,112 @@
+"""
+Memory and hashing cost of node identity on trees with many leaves.
+
+Compares the __slots__ Node keyed by an integer id with the previous layout, where every node kept its attributes in
+a __dict__ and internal nodes were named (and hashed) by the concatenation of their children's names.
+
+    python -m benchmarks.node_identity -n 10000
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from classes import Node, ProfileStore
+
+
+class DictNode:
+    """
+    Attribute layout of the node before __slots__, names are hashed and compared as strings
+    """
+
+    def __init__(self, name: str) -> None:
+        self.children = []
+        self.parent = None
+        self.alignment = ""
+        self.name = name
+        self.is_leaf = True
+        self.is_active = True
+        self.branch_length = 1
+        self.support_value = 0
+        self.best_known = None
+        self.profile = None
+        self.top_hits = []
+
+    def __eq__(self, other: 'DictNode') -> bool:
+        return self.name == other.name
+
+    def __hash__(self) -> int:
+        return hash(self.name)
+
+
+def object_size(node: object) -> int:
+    """
+    Size of the node object itself and its attribute dictionary, if it has one
+    """
+    size = sys.getsizeof(node)
+    if hasattr(node, '__dict__'):
+        size += sys.getsizeof(node.__dict__)
+    return size
+
+
+def caterpillar_names(leaf_names: list[str]) -> list[str]:
+    """
+    Names of the internal nodes when joining the leaves one by one, the worst case for concatenated names
+    """
+    names = []
+    name = leaf_names[0]
+    for leaf_name in leaf_names[1:]:
+        name = name + leaf_name
+        names.append(name)
+    return names
+
+
+def time_lookups(keys: list, table: dict, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for key in keys:
+            table[key]
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=10000, help='number of leaves')
+    parser.add_argument('-r', type=int, default=5, help='lookup repetitions')
+    args = parser.parse_args()
+
+    N = args.n
+    leaf_names = [str(i) for i in range(N)]
+    store = ProfileStore.for_leaves(N, 1)
+    profile = np.zeros((4, 1))
+
+    nodes = [Node(name, "A", profile, store=store) for name in leaf_names]
+    dict_nodes = [DictNode(name) for name in leaf_names]
+    print(f'{N} leaves')
+    print(f'bytes per node:        slots {object_size(nodes[0]):>8}    dict {object_size(dict_nodes[0]):>8}')
+
+    # internal node identity: one concatenated name per join against one int per join
+    start = time.perf_counter()
+    names = caterpillar_names(leaf_names)
+    name_hashes = [hash(name) for name in names]
+    name_time = time.perf_counter() - start
+    name_bytes = sum(sys.getsizeof(name) for name in names)
+
+    start = time.perf_counter()
+    internal = [Node("", "", is_leaf=False, store=store) for _ in range(N - 1)]
+    id_hashes = [hash(node) for node in internal]
+    id_time = time.perf_counter() - start
+    print(f'internal name bytes:   ids   {0:>8}    names {name_bytes:>8}')
+    print(f'build + hash {N - 1} internal nodes: ids {id_time:.4f}s    names {name_time:.4f}s')
+
+    # lookups of fresh keys (as after every join) in a top-hits sized table
+    name_table = {name: 0 for name in names}
+    id_table = {node: 0 for node in internal}
+    name_keys = [''.join(name) for name in names]
+    print(f'{args.r}x{N - 1} dict lookups:    ids {time_lookups(internal, id_table, args.r):.4f}s    '
+          f'names {time_lookups(name_keys, name_table, args.r):.4f}s')
+
+    assert len(set(id_hashes)) == len(set(name_hashes)) == N - 1
+
+
+if __name__ == '__main__':
+    main()
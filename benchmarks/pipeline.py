@@ -0,0 +1,95 @@
+"""
+Time of every phase of the fasttree.py pipeline on JC69 alignments over a grid of sizes.
+
+For every N x L of the grid a random alignment is simulated (see synthetic.jc69_sequences) and built with build_tree,
+as fasttree.py does. The time of every phase is read from a Profiler that only times the phases: parsing, the total
+profile (building the tree), the top hits, the initial topology, the nearest neighbor interchanges, the bootstrap and
+the branch lengths. Every grid cell runs in a fresh process, so the peak
+resident memory reported for it is its own. The results are printed as a table and, with --output, written as JSON.
+
+    python -m benchmarks.pipeline -N 500 1000 2000 -L 200 1000 --gaps 0.05 --output pipeline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from classes import BuildOptions, Profiler, build_tree
+from .synthetic import jc69_sequences, write_fasta
+
+# the phases of build_tree
+PHASES = ('parse', 'total profile', 'top hits', 'initial topology', 'nni', 'bootstrap', 'branch lengths')
+
+
+def peak_rss() -> int:
+    """
+    :return: peak resident memory of this process in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run(N: int, L: int, gap_rate: float, bootstrap_rounds: int, seed: int, single: bool) -> dict:
+    """
+    Runs the pipeline once on a simulated alignment
+    :return: dict with the size, the seconds of every phase and the peak resident memory
+    """
+    # the Distances methods are not wrapped, so the phases take as long as in a run without --profile
+    profiler = Profiler()
+    profiler.enable(distances=False)
+    options = BuildOptions(single=single, bootstrap_rounds=bootstrap_rounds, seed=seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'alignment.aln')
+        write_fasta(path, jc69_sequences(N, L, gap_rate, seed=seed))
+        build_tree(path, options, profiler=profiler)
+
+    phases = {phase: profiler.phases.get(phase, 0.0) for phase in PHASES}
+
+    return {'N': N, 'L': L, 'gap_rate': gap_rate, 'bootstrap_rounds': bootstrap_rounds, 'seconds': phases,
+            'total_seconds': sum(phases.values()), 'peak_rss_bytes': peak_rss()}
+
+
+def isolated(*args) -> dict:
+    """
+    Runs the pipeline in a fresh process, so its peak memory is not the peak of an earlier grid cell
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run, *args).result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-N', type=int, nargs='+', default=[250, 500, 1000], help='numbers of sequences')
+    parser.add_argument('-L', type=int, nargs='+', default=[200, 1000], help='alignment lengths')
+    parser.add_argument('--gaps', type=float, default=0.0, help='fraction of gap cells')
+    parser.add_argument('-b', type=int, default=0, help='bootstrap rounds, the bootstrap phase is skipped at 0')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the simulated alignments and of the bootstrap')
+    parser.add_argument('-s', action='store_true', help='store profiles in single precision')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    print(f'{"N":>7} {"L":>6} ' + ' '.join(f'{phase:>16}' for phase in PHASES) + f' {"total":>9} {"peak RSS":>10}')
+    results = []
+    for N in args.N:
+        for L in args.L:
+            result = isolated(N, L, args.gaps, args.b, args.seed, args.s)
+            results.append(result)
+            print(f'{N:7} {L:6} ' + ' '.join(f'{result["seconds"][phase]:15.3f}s' for phase in PHASES) +
+                  f' {result["total_seconds"]:8.3f}s {result["peak_rss_bytes"] / 2 ** 20:7.1f} MiB', flush=True)
+
+    if args.output:
+        report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                  'gap_rate': args.gaps, 'bootstrap_rounds': args.b, 'seed': args.seed, 'single': args.s,
+                  'results': results}
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
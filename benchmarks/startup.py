@@ -0,0 +1,51 @@
+"""
+Startup time of the command line.
+
+Times fresh interpreters that import the classes package, that run fasttree.py on the smallest bundled alignment, and,
+for comparison, that import Bio.Phylo, which fasttree.py only imports for -t.
+
+    python -m benchmarks.startup --repeat 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = {
+    'python': [sys.executable, '-c', 'pass'],
+    'import classes': [sys.executable, '-c', 'import classes'],
+    'fasttree.py test-small': [sys.executable, 'fasttree.py', 'resources/test-small.aln'],
+    'import Bio.Phylo': [sys.executable, '-c', 'from Bio import Phylo'],
+}
+
+
+def timed(command: list[str], repeat: int) -> float | None:
+    """
+    :return: best of repeat runs of the command, in seconds, or None when it fails
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode:
+            return None
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per command, the best is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, command in COMMANDS.items():
+            if command[1] == 'fasttree.py':
+                command = command + [os.path.join(directory, 'tree.out')]
+            seconds = timed(command, args.repeat)
+            print(f'{name:32}\t' + ('failed' if seconds is None else f'{seconds:8.3f}s'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Random alignments for the benchmarks
+"""
+import numpy as np
+from classes import Node, ProfileStore
+
+BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+
+def random_sequences(N: int, L: int, mutation_rate: float = 0.1, seed: int = 0) -> list[tuple[str, str]]:
+    """
+    N sequences that each differ from a shared random ancestor at a fraction of their columns
+    :param N: number of sequences
+    :param L: length of the sequences
+    :param mutation_rate: fraction of columns that are redrawn per sequence
+    :param seed: seed of the random generator
+    :return: list of (name, sequence)
+    """
+    rng = np.random.default_rng(seed)
+    ancestor = rng.integers(0, 4, L)
+
+    sequences = []
+    for i in range(N):
+        codes = np.where(rng.random(L) < mutation_rate, rng.integers(0, 4, L), ancestor)
+        sequences.append((str(i), BASES[codes].tobytes().decode()))
+
+    return sequences
+
+
+def random_nodes(N: int, L: int, mutation_rate: float = 0.1, seed: int = 0) -> list[Node]:
+    """
+    Leaves for random_sequences, sharing one profile store with room for all joins
+    """
+    store = ProfileStore.for_leaves(N, L)
+    return [Node(name, sequence, store=store) for name, sequence in random_sequences(N, L, mutation_rate, seed)]
+
+
+def jc69_sequences(N: int, L: int, gap_rate: float = 0.0, branch_length: float = 0.05,
+                   seed: int = 0) -> list[tuple[str, str]]:
+    """
+    N sequences evolved under the Jukes-Cantor model along a random tree. The tree grows by splitting a random leaf
+    in two (a Yule tree), every branch has an exponential length of the given mean, and along a branch of length t
+    each column is redrawn uniformly with probability 1 - exp(-4t/3). Gaps are then placed independently in the leaves
+    :param N: number of sequences
+    :param L: length of the sequences
+    :param gap_rate: fraction of the cells of the alignment that become a gap
+    :param branch_length: mean branch length, in expected substitutions per column
+    :param seed: seed of the random generator, the same seed always gives the same alignment
+    :return: list of (name, sequence)
+    """
+    rng = np.random.default_rng(seed)
+
+    # the nodes are created parents first, so every sequence can be drawn as soon as its node exists
+    sequences = [rng.integers(0, 4, L, dtype=np.uint8)]
+    leaves = [0]
+    for _ in range(N - 1):
+        position = int(rng.integers(len(leaves)))
+        parent = sequences[leaves[position]]
+        children = []
+        for _ in range(2):
+            redrawn = rng.random(L) < -np.expm1(-4 / 3 * rng.exponential(branch_length))
+            sequences.append(np.where(redrawn, rng.integers(0, 4, L, dtype=np.uint8), parent))
+            children.append(len(sequences) - 1)
+        sequences[leaves[position]] = None
+        leaves[position] = children[0]
+        leaves.append(children[1])
+
+    letters = np.frombuffer(b'ACGT-', dtype=np.uint8)
+    result = []
+    for i, leaf in enumerate(leaves):
+        codes = np.where(rng.random(L) < gap_rate, 4, sequences[leaf])
+        result.append((f'seq{i}', letters[codes].tobytes().decode()))
+
+    return result
+
+
+def write_fasta(path: str, sequences: list[tuple[str, str]]) -> None:
+    """
+    Writes sequences as an unwrapped FASTA alignment
+    :param path: the output file
+    :param sequences: list of (name, sequence)
+    """
+    with open(path, 'w') as file:
+        for name, sequence in sequences:
+            file.write(f'>{name}\n{sequence}\n')
@@ -0,0 +1,61 @@
+"""
+Scaling of the top-hits initializer.
+
+Times Tree.set_top_hits and the join loop that keeps the top hits up to date on random alignments of growing size with
+m = sqrt(N). It reports how many seeds were compared to all other nodes, how many joins refreshed their top hits by a
+comparison with all active nodes, and the exponent of the growth in time between consecutive sizes. The seed heuristic
+compares O(N / m) seeds to all nodes and a join compares O(m) top hits, so both exponents should stay near 1.5 instead
+of 2, and only a small share of the joins should refresh.
+
+    python -m benchmarks.top_hits 1000 2000 4000 8000 -L 500
+"""
+import argparse
+import math
+import time
+from classes import Tree
+from .synthetic import random_nodes
+
+
+def top_hits(N: int, L: int, close_ratio: float, refresh_ratio: float) -> tuple[float, int, float, int]:
+    """
+    :return: seconds spent in set_top_hits, the number of seeds, seconds spent in construct_initial_topology and the
+        number of refreshes
+    """
+    nodes = random_nodes(N, L)
+    tree = Tree(nodes, round(math.sqrt(N)), N, close_ratio=close_ratio, refresh_ratio=refresh_ratio)
+
+    start = time.perf_counter()
+    tree.set_top_hits()
+    middle = time.perf_counter()
+    tree.construct_initial_topology()
+    return middle - start, tree.seeds, time.perf_counter() - middle, tree.refreshes
+
+
+def exponent(previous: tuple | None, N: int, seconds: float, column: int) -> str:
+    """
+    :return: the exponent of the growth in time since the previous size, empty for the first size
+    """
+    if previous is None:
+        return ''
+    return f' (exponent {math.log(seconds / previous[column]) / math.log(N / previous[0]):4.2f})'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('N', type=int, nargs='*', default=[500, 1000, 2000, 4000])
+    parser.add_argument('-L', type=int, default=500, help='alignment length of the random alignments')
+    parser.add_argument('--close', type=float, default=0.75, help='close ratio of the seed heuristic')
+    parser.add_argument('--refresh', type=float, default=0.8, help='refresh ratio of the join loop')
+    args = parser.parse_args()
+
+    previous = None
+    for N in args.N:
+        seconds, seeds, join_seconds, refreshes = top_hits(N, args.L, args.close, args.refresh)
+        print(f'{f"random N={N} L={args.L}":32}\ttop hits {seconds:8.3f}s\t{seeds:6} seeds'
+              f'{exponent(previous, N, seconds, 1)}\tjoins {join_seconds:8.3f}s\t{refreshes:6} of {N - 1} refreshed'
+              f'{exponent(previous, N, join_seconds, 2)}')
+        previous = N, seconds, join_seconds
+
+
+if __name__ == '__main__':
+    main()
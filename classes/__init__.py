@@ -1,4 +1,15 @@
 from .aln_parser import *
 from .distances import *
 from .tree import *
-from .total_profile import *
\ No newline at end of file
+from .total_profile import *
+from .profile_store import *
+from .active_set import *
+from .distance_cache import *
+from .join_queue import *
+from .encoding import *
+from .alignment_cache import *
+from .bootstrap import *
+from .context import *
+from .profiling import *
+from .build import *
+from .batch import *
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from typing import Iterable, Iterator
+import numpy as np
+from .node import Node
+
+
+class ActiveSet:
+    """
+    The active nodes of the join loop. Membership is a bitmap over the profile store slots of the nodes, so testing,
+    adding and removing are O(1). Iteration goes over a compacted list in insertion order, removed nodes are only
+    dropped from that list the next time it is iterated.
+    """
+
+    def __init__(self, nodes: Iterable[Node], capacity: int) -> None:
+        self._active = bytearray(capacity)
+        self._listed = bytearray(capacity)
+        self._nodes = []
+        self._size = 0
+        self._removed = 0
+
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node: Node) -> bool:
+        return node is not None and self._active[node.index] == 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Node]:
+        self.compact()
+        return iter(self._nodes)
+
+    def __repr__(self) -> str:
+        return f'<ActiveSet:{self._size} active>'
+
+    def add(self, node: Node) -> None:
+        """
+        Marks a node as active
+        :param node: the node to add
+        """
+        if self._active[node.index]:
+            return
+
+        # a node that is added again before its old entry was compacted away would otherwise be listed twice
+        if self._listed[node.index]:
+            self.compact()
+
+        self._active[node.index] = 1
+        self._listed[node.index] = 1
+        self._nodes.append(node)
+        self._size += 1
+
+    def remove(self, node: Node) -> None:
+        """
+        Marks a node as inactive
+        :param node: the node to remove
+        """
+        if node not in self:
+            raise KeyError(node)
+
+        self._active[node.index] = 0
+        self._size -= 1
+        self._removed += 1
+
+    def pop(self) -> Node:
+        """
+        Removes and returns the most recently added active node
+        :return: the removed node
+        """
+        self.compact()
+        node = self._nodes.pop()
+        self._active[node.index] = 0
+        self._listed[node.index] = 0
+        self._size -= 1
+        return node
+
+    def compact(self) -> None:
+        """
+        Drops the removed nodes from the iteration list
+        """
+        if not self._removed:
+            return
+
+        nodes = []
+        for node in self._nodes:
+            if self._active[node.index]:
+                nodes.append(node)
+            else:
+                self._listed[node.index] = 0
+
+        self._nodes = nodes
+        self._removed = 0
+
+    def indices(self) -> np.array:
+        """
+        Store slots of the active nodes, in iteration order
+        :return: integer array
+        """
+        self.compact()
+        return np.fromiter((node.index for node in self._nodes), dtype=np.intp, count=self._size)
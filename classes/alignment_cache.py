@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+
+class AlignmentCache:
+    """
+    Binary copy of a parsed alignment, so later runs on the same input can skip parsing. The file holds a magic
+    string, the length of a JSON header, the header itself (key of the input, names, shapes and offsets), and then,
+    aligned to 64 bytes, the (N, L) uint8 code matrix and the (N, 4, L) block of leaf profiles. Both blocks are
+    read with np.memmap, so loading costs one copy of the leaf profiles into the profile store.
+
+    The cache is keyed by the absolute path, size, modification time and SHA-256 of the input. When only the
+    modification time changed (e.g. the file was touched or copied) the content hash decides.
+    """
+    MAGIC = b'FTCACHE1'
+    ALIGNMENT = 64
+
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @staticmethod
+    def default_path(file_name: str) -> str:
+        return file_name + '.cache'
+
+    @staticmethod
+    def content_hash(file_name: str) -> str:
+        """
+        SHA-256 of a file, read in blocks
+        :param file_name: the file
+        :return: hex digest
+        """
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(file_name: str) -> dict:
+        """
+        Cheap part of the key of an input file, the content hash is only added when it is written
+        :param file_name: the input file
+        :return: dict with path, size and mtime_ns
+        """
+        stat = os.stat(file_name)
+        return {'path': os.path.abspath(file_name), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def write(self, file_name: str, names: list[str], codes: np.array, profiles: np.array) -> None:
+        """
+        Writes the cache of an input file, through a temporary file of this thread so readers never see a partial cache
+        :param file_name: the input file the data was parsed from
+        :param names: the names of the sequences
+        :param codes: (N, L) uint8 code matrix
+        :param profiles: (N, 4, L) leaf profiles
+        """
+        header = self.key(file_name)
+        header['sha256'] = self.content_hash(file_name)
+        header['names'] = names
+        header['shape'] = list(codes.shape)
+        header['dtype'] = np.dtype(profiles.dtype).str
+
+        # the offsets depend on the header length, which depends on the offsets, leave room for their digits
+        header['codes_offset'] = header['profiles_offset'] = 0
+        prefix = len(self.MAGIC) + 8 + len(json.dumps(header).encode()) + 64
+        header['codes_offset'] = self._aligned(prefix)
+        header['profiles_offset'] = self._aligned(header['codes_offset'] + codes.nbytes)
+        encoded = json.dumps(header).encode()
+
+        temporary = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(self.MAGIC)
+                file.write(len(encoded).to_bytes(8, 'little'))
+                file.write(encoded)
+                file.seek(header['codes_offset'])
+                file.write(np.ascontiguousarray(codes, dtype=np.uint8).tobytes())
+                file.seek(header['profiles_offset'])
+                file.write(np.ascontiguousarray(profiles).tobytes())
+            os.replace(temporary, self.path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def read(self, file_name: str) -> tuple[list[str], np.memmap, np.memmap] | None:
+        """
+        Maps the cache of an input file
+        :param file_name: the input file
+        :return: names, (N, L) codes and (N, 4, L) leaf profiles, or None when there is no valid cache for the input
+        """
+        header = self.header()
+        if header is None:
+            return None
+
+        key = self.key(file_name)
+        if header['path'] != key['path'] or header['size'] != key['size']:
+            return None
+        if header['mtime_ns'] != key['mtime_ns']:
+            if header['sha256'] != self.content_hash(file_name):
+                return None
+            # same content, store the new modification time so later runs match on the cheap key again
+            header['mtime_ns'] = key['mtime_ns']
+            self.update_header(header)
+
+        N, L = header['shape']
+        dtype = np.dtype(header['dtype'])
+        if os.path.getsize(self.path) < header['profiles_offset'] + N * 4 * L * dtype.itemsize:
+            return None
+
+        codes = np.memmap(self.path, dtype=np.uint8, mode='r', offset=header['codes_offset'], shape=(N, L))
+        profiles = np.memmap(self.path, dtype=dtype, mode='r', offset=header['profiles_offset'], shape=(N, 4, L))
+        return header['names'], codes, profiles
+
+    def update_header(self, header: dict) -> bool:
+        """
+        Rewrites the header of the cache in place, the data blocks are not touched. The header has room to grow up to
+        the start of the codes, see write
+        :param header: the new header, with the offsets of the cache
+        :return: whether the header was rewritten, not when it does not fit or the cache is not writable
+        """
+        encoded = json.dumps(header).encode()
+        if len(self.MAGIC) + 8 + len(encoded) > header['codes_offset']:
+            return False
+        try:
+            with open(self.path, 'r+b') as file:
+                file.seek(len(self.MAGIC))
+                file.write(len(encoded).to_bytes(8, 'little') + encoded)
+            return True
+        except OSError:
+            return False
+
+    def header(self) -> dict | None:
+        """
+        Reads the header of the cache file
+        :return: the header, or None when the file is missing or not a cache
+        """
+        try:
+            with open(self.path, 'rb') as file:
+                if file.read(len(self.MAGIC)) != self.MAGIC:
+                    return None
+                length = int.from_bytes(file.read(8), 'little')
+                return json.loads(file.read(length))
+        except (OSError, ValueError):
+            return None
+
+    def _aligned(self, offset: int) -> int:
+        return -(-offset // self.ALIGNMENT) * self.ALIGNMENT
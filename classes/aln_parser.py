@@ -1,17 +1,238 @@
+from __future__ import annotations
+from contextlib import nullcontext
+from typing import Iterator, BinaryIO
+import os
+import numpy as np
 from .node import Node
+from .profile_store import ProfileStore
+from .alignment_cache import AlignmentCache
+from .context import BuildContext
+from .encoding import GAP, encode, decode_codes, profile_from_codes, ColumnPatterns, PackedSequences
 
 
 class AlignmentParser:
-    def __init__(self, file_name: str) -> None:
+    """
+    Streams a (possibly wrapped) FASTA alignment into a profile store. A first pass only counts the records and the
+    alignment length to size the store, the second pass encodes one record at a time straight into its slot, so the
+    memory in use is one record plus the store and never the whole file. With a cache file, the parsed alignment is
+    written to it once and later runs map it instead of parsing. A compact alignment keeps the uint8 codes of all
+    sequences instead, and only builds profiles over the informative column patterns, see ColumnPatterns.
+    Alignments that are already in memory are loaded with from_codes
+    """
+    store: ProfileStore
+    N: int
+    L: int
+
+    def __init__(self, file_name: str | os.PathLike | BinaryIO, dtype: type = np.float64,
+                 keep_alignment: bool = False, cache: str = None, compact: bool = False,
+                 context: BuildContext = None) -> None:
+        """
+        :param file_name: path of the alignment, or a seekable binary file object holding it
+        :param dtype: float type of the profiles
+        :param keep_alignment: keep the sequence strings on the leaves, otherwise they are read back from the profiles
+        :param cache: path of a binary cache of the alignment, used when it is valid for the input and written if not,
+            only for alignments given by path
+        :param compact: store repeated columns once and drop the columns that are the same in every sequence
+        :param context: the context of the build, whose logger is used
+        """
+        self.logger = (context if context is not None else BuildContext()).logger
         self.sequences = []
+        is_path = isinstance(file_name, (str, os.PathLike))
+        if not is_path:
+            cache = None
 
+        if cache is not None and self.load_cache(AlignmentCache(cache), file_name, dtype, keep_alignment, compact):
+            self.logger.debug('alignment loaded from cache %s', cache)
+            return
+
+        names = []
+        alignments = []
         try:
-            with open(file_name) as file:
-                lines = file.read().splitlines()
-                for i in range(round(len(lines) / 2)):
-                    self.sequences.append(Node(lines[(i * 2)].strip('>'), lines[(i * 2) + 1].strip()))
-        except:
-            raise Exception("Input file not in correct format!")
+            with open(file_name, 'rb') if is_path else nullcontext(file_name) as file:
+                start = file.tell()
+                self.N, self.L = self.dimensions(file)
+                file.seek(start)
+
+                # one slot per leaf and per internal node the tree will create for them, a compact store is sized
+                # once all codes are known
+                if not compact:
+                    self.store = ProfileStore.for_leaves(self.N, self.L, dtype)
+                    self.store.packed = PackedSequences(self.N, self.L)
+                code_matrix = np.empty((self.N, self.L), dtype=np.uint8) if cache is not None or compact else None
+                for name, sequence in self.records(file):
+                    codes = encode(sequence)
+                    if len(codes) != self.L:
+                        raise ValueError(f'sequence {name} has length {len(codes)} instead of {self.L}')
+
+                    if code_matrix is not None:
+                        code_matrix[len(names)] = codes
+                    names.append(name)
+                    alignments.append(sequence.decode('ascii') if keep_alignment else None)
+
+                    if not compact:
+                        index = self.store.allocate()
+                        profile_from_codes(codes, out=self.store.profiles[index])
+                        self.store.packed.set(index, codes)
+                        self.sequences.append(Node(name, alignments[-1], store=self.store, index=index))
+        except Exception as e:
+            raise Exception("Input file not in correct format!") from e
+
+        if compact:
+            self.compact(names, code_matrix, dtype, alignments)
+
+        if cache is not None:
+            try:
+                # leaf profiles are one-hot, so they are cached as bytes whatever the float type of the store
+                profiles = (code_matrix[:, None, :] == np.arange(4, dtype=np.uint8)[:, None]).astype(np.uint8)
+                AlignmentCache(cache).write(file_name, names, code_matrix, profiles)
+                self.logger.debug('alignment cache written to %s', cache)
+            except OSError as e:
+                self.logger.warning('could not write alignment cache %s: %s', cache, e)
+
+    def compact(self, names: list[str], codes: np.array, dtype: type, alignments: list[str | None]) -> None:
+        """
+        Creates the leaves on a store over the informative column patterns of the alignment
+        :param names: the names of the sequences
+        :param codes: (N, L) code matrix of the alignment
+        :param dtype: float type of the profiles
+        :param alignments: the sequence strings to keep on the leaves, or None for each
+        """
+        patterns = ColumnPatterns(codes)
+        self.store = ProfileStore.for_leaves(self.N, patterns.width, dtype)
+        self.store.patterns = patterns
+        self.store.packed = self.pack(codes)
+        self.logger.debug('compact alignment: %s of %s columns kept as patterns', patterns.width, self.L)
+
+        for name, alignment in zip(names, alignments):
+            index = self.store.allocate()
+            patterns.profile(index, out=self.store.profiles[index])
+            self.sequences.append(Node(name, alignment, store=self.store, index=index))
+
+    def load_cache(self, cache: AlignmentCache, file_name: str, dtype: type, keep_alignment: bool,
+                   compact: bool = False) -> bool:
+        """
+        Fills the store from a cache of the alignment
+        :param cache: the cache
+        :param file_name: path of the alignment
+        :param dtype: float type of the profiles
+        :param keep_alignment: decode the sequence strings from the cached codes
+        :param compact: build a compact store from the cached codes
+        :return: whether the cache was valid for the input
+        """
+        cached = cache.read(file_name)
+        if cached is None:
+            return False
+
+        names, codes, profiles = cached
+        self.fill(names, codes, profiles, dtype, keep_alignment, compact)
+        return True
+
+    @classmethod
+    def from_codes(cls, names: list[str], codes: np.array, dtype: type = np.float64, keep_alignment: bool = False,
+                   compact: bool = False, context: BuildContext = None) -> AlignmentParser:
+        """
+        Loads an alignment that is already in memory
+        :param names: the names of the sequences
+        :param codes: (N, L) uint8 code matrix, see encoding.encode
+        :param dtype: float type of the profiles
+        :param keep_alignment: decode the sequence strings from the codes
+        :param compact: build a compact store, see ColumnPatterns
+        :param context: the context of the build, whose logger is used
+        :return: parser holding the leaves
+        """
+        codes = np.asarray(codes, dtype=np.uint8)
+        if codes.ndim != 2 or len(names) != len(codes) or codes.size == 0:
+            raise ValueError(f'expected a name for every row of a non-empty (N, L) code matrix, got {len(names)} '
+                             f'names and shape {codes.shape}')
+        if codes.max() > GAP:
+            raise ValueError('code matrix holds values that are no nucleotide or gap code')
+
+        parser = cls.__new__(cls)
+        parser.logger = (context if context is not None else BuildContext()).logger
+        parser.sequences = []
+        profiles = (codes[:, None, :] == np.arange(4, dtype=np.uint8)[:, None]).astype(np.uint8)
+        parser.fill(list(names), codes, profiles, dtype, keep_alignment, compact)
+        return parser
+
+    def fill(self, names: list[str], codes: np.array, profiles: np.array, dtype: type, keep_alignment: bool,
+             compact: bool) -> None:
+        """
+        Creates the store and the leaves of an alignment given by its codes and one-hot leaf profiles
+        :param names: the names of the sequences
+        :param codes: (N, L) code matrix
+        :param profiles: (N, 4, L) leaf profiles
+        :param dtype: float type of the profiles
+        :param keep_alignment: decode the sequence strings from the codes
+        :param compact: build a compact store from the codes
+        """
+        self.N, self.L = codes.shape
+        alignments = [decode_codes(sequence_codes) if keep_alignment else None for sequence_codes in codes]
+        if compact:
+            self.compact(names, codes, dtype, alignments)
+            return
+
+        self.store = ProfileStore.for_leaves(self.N, self.L, dtype)
+        self.store.profiles[:self.N] = profiles
+        self.store.packed = self.pack(codes)
+
+        for name, alignment in zip(names, alignments):
+            self.sequences.append(Node(name, alignment, store=self.store, index=self.store.allocate()))
+
+    @staticmethod
+    def pack(codes: np.array) -> PackedSequences:
+        """
+        Bit-packs the rows of a code matrix, over all columns also when the profiles are compact
+        :param codes: (N, L) code matrix
+        :return: the packed sequences
+        """
+        packed = PackedSequences(*codes.shape)
+        for row, sequence_codes in enumerate(codes):
+            packed.set(row, sequence_codes)
+        return packed
+
+    @staticmethod
+    def records(file: BinaryIO) -> Iterator[tuple[str, bytes]]:
+        """
+        Reads the records of a FASTA file one at a time, the lines of wrapped sequences are joined
+        :param file: the file, opened in binary mode
+        :return: iterator of (name, sequence)
+        """
+        name = None
+        lines = []
+        for line in file:
+            line = line.strip()
+            if line.startswith(b'>'):
+                if name is not None:
+                    yield name, b''.join(lines)
+                name = line[1:].decode()
+                lines = []
+            elif line:
+                if name is None:
+                    raise ValueError('sequence before the first header')
+                lines.append(line)
+
+        if name is not None:
+            yield name, b''.join(lines)
+
+    @staticmethod
+    def dimensions(file: BinaryIO) -> tuple[int, int]:
+        """
+        Counts the records of a FASTA file and the length of the first sequence, without keeping any of them
+        :param file: the file, opened in binary mode
+        :return: (N, L)
+        """
+        N = 0
+        L = 0
+        for line in file:
+            line = line.strip()
+            if line.startswith(b'>'):
+                N += 1
+            elif N == 1:
+                L += len(line)
+
+        if N == 0 or L == 0:
+            raise ValueError('no sequences')
+        return N, L
 
     def get_data(self) -> list[Node]:
         """
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from typing import Iterator
+import io
+import os
+import time
+from .build import BuildOptions, build_tree
+from .context import BuildContext
+
+
+class BatchResult:
+    """
+    Outcome of one alignment of a batch: its tree in newick format, or the error that stopped it
+    """
+    __slots__ = ('path', 'newick', 'leaves', 'seconds', 'error')
+
+    def __init__(self, path: str, newick: str = None, leaves: int = 0, seconds: float = 0.0,
+                 error: str = None) -> None:
+        self.path = path
+        self.newick = newick
+        self.leaves = leaves
+        self.seconds = seconds
+        self.error = error
+
+
+def batch_inputs(source: str, extension: str = '.aln') -> list[str]:
+    """
+    The alignments of a batch, either all files with the extension in a directory, or the paths listed in a manifest
+    file, one per line. Relative paths of a manifest are relative to the manifest, empty lines and lines starting with
+    # are skipped
+    :param source: a directory or a manifest file
+    :param extension: extension of the alignments in a directory
+    :return: the paths of the alignments, sorted for a directory and in the order of the manifest otherwise
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if name.endswith(extension) and os.path.isfile(os.path.join(source, name)))
+
+    directory = os.path.dirname(source)
+    with open(source) as file:
+        lines = [line.strip() for line in file]
+    return [os.path.join(directory, line) for line in lines if line and not line.startswith('#')]
+
+
+def output_names(paths: list[str], source: str, extension: str = '.out') -> list[str]:
+    """
+    Names of the output files of the alignments of a batch. An alignment below the directory of the batch (the
+    directory itself, or the directory of the manifest) keeps its path relative to it, so x.aln in the subdirectories a
+    and b is written to a/x.out and b/x.out. An alignment elsewhere is named after its file only
+    :param paths: the alignments, see batch_inputs
+    :param source: the directory or manifest file the alignments were listed from
+    :param extension: extension of the output files
+    :return: the names relative to the output directory, in the order of the paths
+    :raises ValueError: when two alignments would be written to the same file
+    """
+    directory = source if os.path.isdir(source) else os.path.dirname(source)
+    names = {}
+    for path in paths:
+        relative = os.path.relpath(path, directory or os.curdir)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            relative = os.path.basename(path)
+        name = os.path.splitext(relative)[0] + extension
+        if name in names:
+            raise ValueError(f'{names[name]} and {path} would both be written to {name}')
+        names[name] = path
+
+    return list(names)
+
+
+def build_newick(path: str, options: BuildOptions) -> BatchResult:
+    """
+    Builds the tree of one alignment of a batch, errors are returned instead of raised so one bad input does not stop
+    the batch
+    :param path: the alignment
+    :param options: the build options
+    :return: the result, holding only the newick string so the tree itself never leaves the worker
+    """
+    start = time.perf_counter()
+    try:
+        tree = build_tree(path, options, BuildContext(os.path.basename(path), options.seed))
+        newick = io.StringIO()
+        tree.write_newick(newick)
+        return BatchResult(path, newick.getvalue(), tree.N, time.perf_counter() - start)
+    except Exception as e:
+        message = f'{e}: {e.__cause__}' if e.__cause__ is not None else str(e)
+        return BatchResult(path, seconds=time.perf_counter() - start, error=message)
+
+
+def build_batch(paths: list[str], options: BuildOptions = None, workers: int = 1,
+                pending: int = None) -> Iterator[BatchResult]:
+    """
+    Builds the trees of many alignments. With more than one worker the alignments are built in a process pool whose
+    workers stay up for the whole batch, so the interpreter start and the imports are paid once per worker instead of
+    once per alignment. At most pending alignments are in flight at once, so the memory in use does not grow with the
+    size of the batch
+    :param paths: the alignments
+    :param options: the build options of every alignment, the bootstrap of each alignment runs in its worker
+    :param workers: number of processes
+    :param pending: maximum number of alignments submitted but not yet returned, twice the workers by default
+    :return: iterator of the results in the order they finish
+    """
+    options = options if options is not None else BuildOptions()
+    if workers <= 1:
+        for path in paths:
+            yield build_newick(path, options)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    pending = pending if pending is not None else 2 * workers
+    remaining = iter(paths)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = set()
+        for path in remaining:
+            futures.add(pool.submit(build_newick, path, options))
+            if len(futures) >= pending:
+                break
+
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                path = next(remaining, None)
+                if path is not None:
+                    futures.add(pool.submit(build_newick, path, options))
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import numpy as np
+from .distances import Distances
+from .encoding import ColumnPatterns
+
+# the pairs of the quartet (a, b, c, d) compared in every round: ab, cd, ac, bd, bc, ad
+PAIRS_1 = [0, 2, 0, 1, 1, 0]
+PAIRS_2 = [1, 3, 2, 3, 2, 3]
+
+SCHEMES = ('subsample', 'resample')
+
+# number of replicate weights (rows times columns) built at once
+BLOCK_CELLS = 1 << 20
+
+# profile block and column patterns of the pool workers, attached once per process
+_memory = None
+_profiles = None
+_patterns = None
+
+
+def replicate_weights(rng: np.random.Generator, replicates: int, L: int, scheme: str = 'subsample',
+                      fraction: float = 0.2) -> np.array:
+    """
+    Column weights of bootstrap replicates, one row per replicate
+    subsample: a random subset of round(fraction * L) columns, each with weight one
+    resample: L columns drawn with replacement, each column weighted by the number of times it was drawn
+    :param rng: the random generator
+    :param replicates: number of replicates
+    :param L: number of columns
+    :param scheme: 'subsample' or 'resample'
+    :param fraction: fraction of the columns of a subsample
+    :return: (replicates, L) array of weights, every row sums to the number of sampled columns
+    """
+    if scheme == 'resample':
+        draws = rng.integers(0, L, (replicates, L)) + L * np.arange(replicates)[:, None]
+        return np.bincount(draws.ravel(), minlength=replicates * L).reshape(replicates, L).astype(float)
+    if scheme != 'subsample':
+        raise ValueError(f'unknown bootstrap scheme {scheme!r}, expected one of {SCHEMES}')
+
+    k = max(1, round(L * fraction))
+    columns = np.argpartition(rng.random((replicates, L)), k - 1, axis=1)[:, :k]
+    weights = np.zeros((replicates, L))
+    np.put_along_axis(weights, columns, 1, axis=1)
+    return weights
+
+
+def split_support(profiles: np.array, quartet: np.array, rounds: int, seed: np.random.SeedSequence,
+                  scheme: str = 'subsample', fraction: float = 0.2, patterns: ColumnPatterns = None) -> float:
+    """
+    Fraction of the bootstrap rounds in which the quartet (a, b, c, d) prefers the split ab|cd over ac|bd and ad|bc.
+    The per-column contribution |p_x - p_y| of the six pairs is computed once, the resampled profile distances of
+    all rounds are then one product of the (rounds, L) column weights with the (L, 6) contributions
+    :param profiles: block of profiles, shape (K, 4, L)
+    :param quartet: the rows of a, b, c and d in the block
+    :param rounds: number of bootstrap rounds
+    :param seed: seed of the rounds of this split
+    :param scheme: 'subsample' or 'resample', see replicate_weights
+    :param fraction: fraction of the columns sampled per round of a subsample
+    :param patterns: the column patterns of compact profiles, the rounds sample the original columns
+    :return: support of the split
+    """
+    rng = np.random.default_rng(seed)
+    quartet_profiles = profiles[quartet]
+    contributions = np.abs(quartet_profiles[PAIRS_1] - quartet_profiles[PAIRS_2]).sum(axis=1).T
+    if patterns is not None:
+        contributions = patterns.expand(contributions / patterns.scale[:, None])
+    L = len(contributions)
+
+    result = 0
+    step = max(1, BLOCK_CELLS // L)
+    for start in range(0, rounds, step):
+        weights = replicate_weights(rng, min(step, rounds - start), L, scheme, fraction)
+        distances = (weights @ contributions) / (4 * weights.sum(axis=1, keepdims=True))
+        d_ab, d_cd, d_ac, d_bd, d_bc, d_ad = Distances.log_corrected_distances(distances).T
+        result += np.count_nonzero(d_ab + d_cd < np.minimum(d_ac + d_bd, d_bc + d_ad))
+
+    return result / rounds
+
+
+def _attach(name: str, shape: tuple, dtype: str, patterns: ColumnPatterns) -> None:
+    """
+    Initializer of the pool workers, maps the shared profile block read-only
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    global _memory, _profiles, _patterns
+    _patterns = patterns
+    _memory = SharedMemory(name=name)
+    _profiles = np.ndarray(shape, dtype=dtype, buffer=_memory.buf)
+    _profiles.flags.writeable = False
+
+
+def _shard_support(quartets: np.array, seeds: list[np.random.SeedSequence], rounds: int, scheme: str) -> list[float]:
+    return [split_support(_profiles, quartet, rounds, seed, scheme, patterns=_patterns)
+            for quartet, seed in zip(quartets, seeds)]
+
+
+def bootstrap_support(profiles: np.array, quartets: np.array, rounds: int, seed: np.random.SeedSequence,
+                      workers: int = 1, scheme: str = 'subsample', patterns: ColumnPatterns = None) -> np.array:
+    """
+    Support of many splits. Every split draws its columns from its own child of the seed, so the result only depends
+    on the seed and never on the number of workers. With more than one worker the profile block is copied once into
+    shared memory and the splits are sharded over a process pool, tasks only carry indices and seeds
+    :param profiles: block of profiles, shape (K, 4, L)
+    :param quartets: (S, 4) rows of a, b, c and d of every split
+    :param rounds: number of bootstrap rounds
+    :param seed: seed of the whole bootstrap
+    :param workers: number of processes
+    :param scheme: 'subsample' or 'resample', see replicate_weights
+    :param patterns: the column patterns of compact profiles
+    :return: array of S supports
+    """
+    seeds = seed.spawn(len(quartets))
+    if workers <= 1 or len(quartets) <= 1:
+        return np.array([split_support(profiles, quartet, rounds, s, scheme, patterns=patterns)
+                         for quartet, s in zip(quartets, seeds)])
+
+    # the process pool is only imported when it is used, it adds to the startup of every run
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+
+    memory = SharedMemory(create=True, size=max(profiles.nbytes, 1))
+    try:
+        shared = np.ndarray(profiles.shape, dtype=profiles.dtype, buffer=memory.buf)
+        shared[...] = profiles
+
+        # a few shards per worker evens out the load without paying for one task per split
+        step = -(-len(quartets) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_attach,
+                                 initargs=(memory.name, profiles.shape, profiles.dtype.str, patterns)) as pool:
+            shards = [pool.submit(_shard_support, quartets[i:i + step], seeds[i:i + step], rounds, scheme)
+                      for i in range(0, len(quartets), step)]
+            result = np.concatenate([shard.result() for shard in shards])
+
+        del shared
+        return result
+    finally:
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+from typing import BinaryIO, Mapping, Sequence, TextIO
+import io
+import logging
+import math
+import os
+import numpy as np
+from .aln_parser import AlignmentParser
+from .context import BuildContext
+from .encoding import encode
+from . import profiling
+from .profiling import Profiler
+from .tree import Tree
+
+
+class BuildOptions:
+    """
+    Settings of a tree build, the defaults are those of the fasttree.py command line
+    """
+
+    def __init__(self, single: bool = False, compact: bool = False, cache: str = None, m: int = None,
+                 close_ratio: float = 0.75, refresh_ratio: float = 0.8, nni_rounds: int = None,
+                 bootstrap_rounds: int = 0, resample: bool = False, workers: int = 1, seed: int = None) -> None:
+        """
+        :param single: store profiles in single precision
+        :param compact: store repeated columns once and drop the constant columns, see ColumnPatterns
+        :param cache: path of a binary cache of the alignment, only used for alignments given by path
+        :param m: length of the top-hits lists, the square root of the number of sequences if not given
+        :param close_ratio: see Tree
+        :param refresh_ratio: see Tree
+        :param nni_rounds: maximum number of NNI rounds, log2(N) + 1 if not given
+        :param bootstrap_rounds: bootstrap rounds per split, no bootstrap at 0
+        :param resample: bootstrap by resampling all columns instead of drawing a subset
+        :param workers: number of processes for the bootstrap
+        :param seed: seed of the bootstrap
+        """
+        self.single = single
+        self.compact = compact
+        self.cache = cache
+        self.m = m
+        self.close_ratio = close_ratio
+        self.refresh_ratio = refresh_ratio
+        self.nni_rounds = nni_rounds
+        self.bootstrap_rounds = bootstrap_rounds
+        self.resample = resample
+        self.workers = workers
+        self.seed = seed
+
+
+def read_alignment(alignment, options: BuildOptions, context: BuildContext = None) -> AlignmentParser:
+    """
+    Loads an alignment given in any of the forms accepted by build_tree
+    :param alignment: see build_tree
+    :param options: the build options
+    :param context: the context of the build
+    :return: parser holding the leaves
+    """
+    dtype = np.float32 if options.single else np.float64
+    if isinstance(alignment, (str, os.PathLike)):
+        return AlignmentParser(alignment, dtype, cache=options.cache, compact=options.compact, context=context)
+
+    if isinstance(alignment, io.IOBase) or hasattr(alignment, 'read'):
+        # the parser reads twice, text and unseekable streams are read into memory first
+        if isinstance(alignment, io.TextIOBase):
+            alignment = io.BytesIO(alignment.read().encode())
+        elif not alignment.seekable():
+            alignment = io.BytesIO(alignment.read())
+        return AlignmentParser(alignment, dtype, compact=options.compact, context=context)
+
+    if isinstance(alignment, Mapping):
+        names, sequences = list(alignment.keys()), list(alignment.values())
+    elif isinstance(alignment, np.ndarray) and alignment.ndim == 2:
+        names, sequences = [str(i) for i in range(len(alignment))], alignment
+    else:
+        pairs = [(name, sequence) for name, sequence in alignment]
+        names, sequences = [name for name, _ in pairs], [sequence for _, sequence in pairs]
+
+    if isinstance(sequences, np.ndarray) and sequences.dtype.kind in 'ui':
+        codes = sequences
+    else:
+        rows = [encode(row.astype('S1').tobytes() if isinstance(row, np.ndarray) else row) for row in sequences]
+        if len({len(row) for row in rows}) > 1:
+            raise ValueError('the sequences of an alignment must all have the same length')
+        codes = np.array(rows, dtype=np.uint8)
+    return AlignmentParser.from_codes(names, codes, dtype, compact=options.compact, context=context)
+
+
+def build_tree(alignment: str | os.PathLike | BinaryIO | TextIO | Mapping[str, str] | Sequence[tuple[str, str]] |
+               np.ndarray, options: BuildOptions = None, context: BuildContext = None,
+               profiler: Profiler = None) -> Tree:
+    """
+    Builds a tree from an alignment: top hits, the joins of the initial topology, nearest neighbor interchanges, the
+    optional bootstrap and the branch lengths. The alignment can be
+    - the path of a FASTA file
+    - a binary or text file object holding FASTA
+    - a mapping of names to sequences, or a sequence of (name, sequence) pairs
+    - an (N, L) array, either the uint8 codes of encoding.encode or the characters of the sequences, the sequences
+      are then named by their row
+    Builds with their own context share no state, so independent builds can run in parallel threads
+    :param alignment: the alignment
+    :param options: the build options, the defaults of BuildOptions if not given
+    :param context: the context of the build, an unnamed context seeded with the seed of the options if not given
+    :param profiler: the profiler that times the phases of the build, the profiler of the run if not given
+    :return: the tree, its newick representation is written with Tree.write_newick
+    """
+    options = options if options is not None else BuildOptions()
+    context = context if context is not None else BuildContext(seed=options.seed)
+    profiler = profiler if profiler is not None else profiling.profiler
+    logger = context.logger
+    with profiler.phase('parse'):
+        parser = read_alignment(alignment, options, context)
+
+    nodes = parser.get_data()
+    N = len(nodes)
+    m = options.m if options.m is not None else round(math.sqrt(N))
+    with profiler.phase('total profile'):
+        tree = Tree(nodes, m, N, parser.L, options.bootstrap_rounds > 0, options.bootstrap_rounds,
+                    options.close_ratio, options.refresh_ratio, context)
+
+    # the sequences are decoded from the profiles, only do so when they are logged
+    if logger.isEnabledFor(logging.DEBUG):
+        for node in nodes:
+            logger.debug(f'{node.name=}\t{node.alignment}\t {node.profile=}')
+        logger.debug(f'{tree.tp.total_profile=}')
+
+    with profiler.phase('top hits'):
+        tree.set_top_hits()
+    if logger.isEnabledFor(logging.DEBUG):
+        for node in nodes:
+            logger.debug(f'{node.name=} top hits: {[_.name for _ in node.top_hits]}\t '
+                         f'{round(node.best_known.distance)=} {node.best_known.node.name=}')
+
+    with profiler.phase('initial topology'):
+        tree.construct_initial_topology()
+
+    with profiler.phase('nni'):
+        rounds = options.nni_rounds if options.nni_rounds is not None else round(math.log(N) / math.log(2) + 1)
+        tree.nearest_neighbor_interchanges(rounds)
+
+    if options.bootstrap_rounds:
+        with profiler.phase('bootstrap'):
+            tree.bootstrap(options.workers, options.seed, 'resample' if options.resample else 'subsample')
+
+    with profiler.phase('branch lengths'):
+        tree.calculate_branch_length()
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Final topology: %s', tree.to_newick())
+    return tree
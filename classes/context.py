@@ -0,0 +1,35 @@
+from __future__ import annotations
+import logging
+import numpy as np
+
+
+class BuildLogger(logging.LoggerAdapter):
+    """
+    Logger of one build, the messages of a named build are prefixed with its name so the logs of builds that run at
+    the same time can be told apart
+    """
+
+    def process(self, msg, kwargs):
+        msg, kwargs = super().process(msg, kwargs)
+        name = self.extra['build']
+        return (f'[{name}] {msg}' if name else msg), kwargs
+
+
+class BuildContext:
+    """
+    The state of one tree build that is not held by its own nodes, trees and stores: its name, the seed all its
+    randomness (the bootstrap) is spawned from, and its logger. Nothing of a build is shared with other builds through
+    module globals, so builds with their own context can run in parallel threads of one process
+    """
+    name: str | None
+    seed: np.random.SeedSequence
+    logger: BuildLogger
+
+    def __init__(self, name: str = None, seed: int | np.random.SeedSequence = None) -> None:
+        """
+        :param name: name of the build, shown in its log messages
+        :param seed: seed of the randomness of the build, e.g. the bootstrap, fresh entropy if not given
+        """
+        self.name = name
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.logger = BuildLogger(logging.getLogger('FastTree'), {'build': name})
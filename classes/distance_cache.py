@@ -0,0 +1,159 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Iterable
+import numpy as np
+from .node import Node
+from .distances import Distances
+from .total_profile import TotalProfile
+
+
+class OutDistanceCache:
+    """
+    Memo of the out-distances r(i) of the active nodes. Every entry is tagged with the version of the total profile
+    it was computed against, the version changes on every join, switch or recompute of the total profile, which are
+    the only events that change r(i).
+    """
+
+    def __init__(self) -> None:
+        self.values: dict[int, tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def out_distance(self, node: Node, tp: TotalProfile, active: Iterable[Node]) -> float:
+        """
+        r(i) of a node, computed only if the total profile changed since it was last asked for
+        :param node: the given node
+        :param tp: the total profile of the tree
+        :param active: the active nodes
+        :return: the out-distance
+        """
+        entry = self.values.get(node.id)
+        if entry is not None and entry[0] == tp.version:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = Distances.total_profile_out_distance(node, tp, active)
+        self.values[node.id] = (tp.version, value)
+        return value
+
+    def out_distances(self, nodes: list[Node], tp: TotalProfile, active: Iterable[Node]) -> np.array:
+        """
+        r(i) of many nodes at once, the stale and missing ones are computed in one batch
+        :param nodes: the given nodes
+        :param tp: the total profile of the tree
+        :param active: the active nodes
+        :return: array of out-distances, in the order of nodes
+        """
+        result = np.empty(len(nodes))
+        missing = []
+
+        for i, node in enumerate(nodes):
+            entry = self.values.get(node.id)
+            if entry is not None and entry[0] == tp.version:
+                result[i] = entry[1]
+            else:
+                missing.append(i)
+
+        self.hits += len(nodes) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_nodes = [nodes[i] for i in missing]
+            values = Distances.total_profile_out_distances(missing_nodes, tp, active)
+            result[missing] = values
+            for node, value in zip(missing_nodes, values.tolist()):
+                self.values[node.id] = (tp.version, value)
+
+        return result
+
+    def discard(self, node: Node) -> None:
+        """
+        Drops the entry of a node that is no longer active
+        :param node: the node
+        """
+        self.values.pop(node.id, None)
+
+
+class LogDistanceCache:
+    """
+    Bounded memo of the log corrected profile distances between pairs of nodes, used by the interchanges, whose
+    rounds revisit the same quartets. Entries are keyed by the ids of both nodes and the versions of their profiles,
+    so a rewritten profile never hits an old entry, and the least recently used entries are dropped once the memo is
+    full.
+    """
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        self.values: OrderedDict[tuple[int, int, int, int], float] = OrderedDict()
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def key(node_1: Node, node_2: Node) -> tuple[int, int, int, int]:
+        """
+        Key of a pair of nodes, the same for both orders of the pair
+        :return: (id, version, id, version), lowest id first
+        """
+        if node_2.id < node_1.id:
+            node_1, node_2 = node_2, node_1
+        return node_1.id, node_1.profile_version, node_2.id, node_2.profile_version
+
+    def distance(self, node_1: Node, node_2: Node) -> float:
+        """
+        Log corrected profile distance between two nodes
+        :param node_1: the first node
+        :param node_2: the second node
+        :return: the distance
+        """
+        return float(self.distances([node_1], [node_2])[0])
+
+    def distances(self, nodes_1: list[Node], nodes_2: list[Node]) -> np.array:
+        """
+        Log corrected profile distances between pairs of nodes, the missing ones are computed in one batch
+        :param nodes_1: the first node of every pair
+        :param nodes_2: the second node of every pair
+        :return: array of distances, in the order of the pairs
+        """
+        keys = [self.key(node_1, node_2) for node_1, node_2 in zip(nodes_1, nodes_2)]
+        result = np.empty(len(keys))
+        missing = []
+
+        for i, key in enumerate(keys):
+            value = self.values.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                self.values.move_to_end(key)
+                result[i] = value
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            values = Distances.log_corrected_profile_distances(np.array([nodes_1[i].profile for i in missing]),
+                                                               np.array([nodes_2[i].profile for i in missing]))
+            result[missing] = values
+            for i, value in zip(missing, values.tolist()):
+                self.values[keys[i]] = value
+
+            while len(self.values) > self.capacity:
+                self.values.popitem(last=False)
+
+        return result
@@ -1,10 +1,17 @@
+from __future__ import annotations
 import math
 import numpy as np
+from typing import TYPE_CHECKING
 from .node import Node
-from .total_profile import TotalProfile
+
+if TYPE_CHECKING:
+    from .total_profile import TotalProfile
+    from .distance_cache import OutDistanceCache
 
 
 class Distances:
+    # number of profile cells gathered at once by the batched distances, sized to stay in cache
+    BATCH_CELLS = 1 << 15
 
     @staticmethod
     def uncorrected_distance(sequence_1: str, sequence_2: str) -> float:
@@ -43,12 +50,89 @@ class Distances:
         :param profile_1: the first profile
         :param profile_2: the second profile
         """
-        S = 0
-        for i in range(4):
-            for j in range(len(profile_1[0])):
-                S += abs(profile_1[i, j] - profile_2[i, j])
+        return float(Distances.profile_distances(profile_1, profile_2))
+
+    @staticmethod
+    def profile_distances(profiles_1: np.array, profiles_2: np.array) -> np.array:
+        """
+        D for many profiles at once. The leading axes of both arguments are broadcast against each other, so one
+        (4, L) profile against a (K, 4, L) stack gives K distances and two (K, 4, L) stacks give K pairwise distances
+        :param profiles_1: a profile or a stack of profiles
+        :param profiles_2: a profile or a stack of profiles
+        :return: array with the broadcast leading shape of the two arguments
+        """
+        profiles_1 = np.asarray(profiles_1)
+        profiles_2 = np.asarray(profiles_2)
+        return np.abs(profiles_1 - profiles_2).sum(axis=(-2, -1)) / (4 * profiles_1.shape[-1])
+
+    @staticmethod
+    def indexed_profile_distances(profile: np.array, profiles: np.array, indices: np.array) -> np.array:
+        """
+        D between one profile and selected rows of a block of profiles. The rows are gathered in cache sized chunks
+        into one reused buffer, which is about twice as fast as broadcasting against all of them at once
+        :param profile: the profile
+        :param profiles: block of profiles, shape (K, 4, L)
+        :param indices: the rows of the block to compare with
+        :return: array of distances, in the order of indices
+        """
+        result = np.empty(len(indices))
+        step = max(1, Distances.BATCH_CELLS // profile.size)
+        buffer = np.empty((min(step, len(indices)),) + profiles.shape[1:], dtype=np.result_type(profile, profiles))
+
+        for start in range(0, len(indices), step):
+            rows = indices[start:start + step]
+            chunk = buffer[:len(rows)]
+            if chunk.dtype == profiles.dtype:
+                np.take(profiles, rows, axis=0, out=chunk)
+            else:
+                chunk[...] = profiles[rows]
+            np.subtract(chunk, profile, out=chunk)
+            np.abs(chunk, out=chunk)
+            result[start:start + step] = chunk.reshape(len(rows), -1).sum(axis=1)
+
+        return result / (4 * profiles.shape[-1])
+
+    @staticmethod
+    def indexed_pair_distances(profiles: np.array, rows_1: np.array, rows_2: np.array) -> np.array:
+        """
+        D between pairs of rows of a block of profiles, gathered in cache sized chunks like indexed_profile_distances
+        :param profiles: block of profiles, shape (K, 4, L)
+        :param rows_1: the first row of every pair
+        :param rows_2: the second row of every pair
+        :return: array of distances, in the order of the pairs
+        """
+        result = np.empty(len(rows_1))
+        step = max(1, Distances.BATCH_CELLS // profiles[0].size)
+        buffer_1 = np.empty((min(step, len(rows_1)),) + profiles.shape[1:], dtype=profiles.dtype)
+        buffer_2 = np.empty_like(buffer_1)
 
-        return S / (4 * len(profile_1[0]))
+        for start in range(0, len(rows_1), step):
+            chunk_1 = buffer_1[:len(rows_1[start:start + step])]
+            chunk_2 = buffer_2[:len(chunk_1)]
+            np.take(profiles, rows_1[start:start + step], axis=0, out=chunk_1)
+            np.take(profiles, rows_2[start:start + step], axis=0, out=chunk_2)
+            np.subtract(chunk_1, chunk_2, out=chunk_1)
+            np.abs(chunk_1, out=chunk_1)
+            result[start:start + step] = chunk_1.reshape(len(chunk_1), -1).sum(axis=1)
+
+        return result / (4 * profiles.shape[-1])
+
+    @staticmethod
+    def profile_distance_matrix(profiles_1: np.array, profiles_2: np.array) -> np.array:
+        """
+        D between every profile of one stack and every profile of another stack
+        :param profiles_1: stack of K profiles, shape (K, 4, L)
+        :param profiles_2: stack of M profiles, shape (M, 4, L)
+        :return: (K, M) distance matrix
+        """
+        profiles_2 = np.asarray(profiles_2)
+        result = np.empty((len(profiles_1), len(profiles_2)))
+
+        # one row at a time keeps the temporary at (M, 4, L) instead of (K, M, 4, L)
+        for i, profile in enumerate(profiles_1):
+            result[i] = Distances.profile_distances(profile, profiles_2)
+
+        return result
 
     @staticmethod
     def up_distance(node: Node) -> float:
@@ -60,14 +144,48 @@ class Distances:
         """
         if node.is_leaf:
             return 0.0
-        else:
-            return Distances.profile_distance(node.children[0].profile, node.children[-1].profile) / 2
+
+        # cached next to the profile, the store resets it whenever the profile of the node is rewritten
+        up_distance = node.store.up_distances[node.index]
+        if up_distance != up_distance:
+            up_distance = Distances.profile_distance(node.children[0].profile, node.children[-1].profile) / 2
+            node.store.up_distances[node.index] = up_distance
+
+        return float(up_distance)
 
     @staticmethod
     def node_distance(node1: Node, node2: Node) -> float:
+        # two parsed leaves are compared on their packed bits, their up-distances are zero
+        if node1.is_leaf and node2.is_leaf and node1.store is node2.store and node1.store.packed is not None:
+            return node1.store.packed.distance(node1.index, node2.index)
+
         return Distances.profile_distance(node1.profile, node2.profile) - Distances.up_distance(
             node1) - Distances.up_distance(node2)
 
+    @staticmethod
+    def node_distances(node: Node, nodes: list[Node]) -> np.array:
+        """
+        du(i, j) between one node and many nodes of the same profile store
+        :param node: the node i
+        :param nodes: the nodes j
+        :return: array of distances, in the order of nodes
+        """
+        indices = np.fromiter((n.index for n in nodes), dtype=np.intp, count=len(nodes))
+        packed = node.store.packed
+        if packed is None or not node.is_leaf:
+            result = Distances.indexed_profile_distances(node.profile, node.store.profiles, indices)
+        else:
+            # leaf against leaf on the packed bits, only the internal nodes need their profiles
+            leaves = np.fromiter((n.is_leaf for n in nodes), dtype=bool, count=len(nodes))
+            result = np.empty(len(nodes))
+            result[leaves] = packed.distances(node.index, indices[leaves])
+            if not leaves.all():
+                result[~leaves] = Distances.indexed_profile_distances(node.profile, node.store.profiles,
+                                                                      indices[~leaves])
+
+        up_distances = np.fromiter((Distances.up_distance(n) for n in nodes), dtype=float, count=len(nodes))
+        return result - Distances.up_distance(node) - up_distances
+
     @staticmethod
     def out_distance(node: Node, active: list) -> float:
         """
@@ -82,32 +200,82 @@ class Distances:
         return S / (len(active) - 2) if len(active) > 2 else S / (len(active))
 
     @staticmethod
-    def neighbor_join_distance(node1: Node, node2: Node, active: list[Node], total_profile: TotalProfile) -> float:
+    def neighbor_join_distance(node1: Node, node2: Node, active: list[Node], total_profile: TotalProfile,
+                               cache: OutDistanceCache = None) -> float:
         """
         Neighbor-Joining Distance: du(i,j) - r(i) - r(j)
         :param total_profile: total profile of all the nodes
         :param node1: the first node
         :param node2: the second node
         :param active: the list of all active nodes
+        :param cache: optional memo of the out-distances
         """
-        return Distances.node_distance(node1, node2) - Distances.total_profile_out_distance(node1, total_profile,
-                                                                                                    active) - \
-                       Distances.total_profile_out_distance(node2, total_profile, active)
+        if cache is None:
+            return Distances.node_distance(node1, node2) - \
+                   Distances.total_profile_out_distance(node1, total_profile, active) - \
+                   Distances.total_profile_out_distance(node2, total_profile, active)
+
+        return Distances.node_distance(node1, node2) - cache.out_distance(node1, total_profile, active) - \
+               cache.out_distance(node2, total_profile, active)
+
+    @staticmethod
+    def neighbor_join_distances(node: Node, nodes: list[Node], active: list[Node], total_profile: TotalProfile,
+                                cache: OutDistanceCache = None) -> np.array:
+        """
+        Neighbor-Joining Distance between one node and many nodes at once
+        :param node: the node i
+        :param nodes: the nodes j
+        :param active: the list of all active nodes
+        :param total_profile: total profile of all the nodes
+        :param cache: optional memo of the out-distances
+        :return: array of distances, in the order of nodes
+        """
+        if cache is None:
+            out_distances = Distances.total_profile_out_distances(nodes, total_profile, active)
+            out_distance = Distances.total_profile_out_distance(node, total_profile, active)
+        else:
+            out_distances = cache.out_distances(nodes, total_profile, active)
+            out_distance = cache.out_distance(node, total_profile, active)
+
+        return Distances.node_distances(node, nodes) - out_distance - out_distances
 
     @staticmethod
     def total_profile_out_distance(node: Node, tp: TotalProfile, active: list[Node]) -> float:
         """
         r(i): Out Distance = n∆(i, T) − ∆(i, i) − (n − 1)u(i) + u(i) - Σ u(j)
+        Σ u(j) is kept up to date by the total profile, so this is O(L) instead of O(n L)
         :param node: the given node
         :param tp: the total profile of the tree
         :param active: the list of all active nodes
         """
-        S = 0
-        for n in active:
-            S += Distances.up_distance(node)
-
+        up_distance = Distances.up_distance(node)
         result = len(active) * Distances.profile_distance(node.profile, tp.total_profile) - \
-                 Distances.average_node_children_distance(node) - (len(active) - 2) * Distances.up_distance(node) - S
+                 Distances.average_node_children_distance(node) - (len(active) - 2) * up_distance - tp.up_distance_sum
+
+        return result / (len(active) - 2) if len(active) > 2 else result / (len(active))
+
+    @staticmethod
+    def total_profile_out_distances(nodes: list[Node], tp: TotalProfile, active: list[Node]) -> np.array:
+        """
+        r(i) for many nodes of the same profile store at once, see total_profile_out_distance
+        :param nodes: the given nodes
+        :param tp: the total profile of the tree
+        :param active: the list of all active nodes
+        :return: array of out-distances, in the order of nodes
+        """
+        if not nodes:
+            return np.empty(0)
+
+        indices = np.fromiter((n.index for n in nodes), dtype=np.intp, count=len(nodes))
+        total_distances = Distances.indexed_profile_distances(tp.total_profile, nodes[0].store.profiles, indices)
+
+        up_distances = np.fromiter((Distances.up_distance(n) for n in nodes), dtype=float, count=len(nodes))
+        children_distances = np.fromiter((Distances.average_node_children_distance(n) if len(n.children) != 2
+                                          else up_distances[i] for i, n in enumerate(nodes)),
+                                         dtype=float, count=len(nodes))
+
+        result = len(active) * total_distances - children_distances - (len(active) - 2) * up_distances - \
+                 tp.up_distance_sum
 
         return result / (len(active) - 2) if len(active) > 2 else result / (len(active))
 
@@ -118,10 +286,8 @@ class Distances:
         :param node: the given node under examination
         """
         if len(node.children) == 0: return 0
-        S = 0
-        for child in node.children:
-            for child2 in node.children:
-                S += Distances.profile_distance(child.profile, child2.profile)
+        profiles = np.array([child.profile for child in node.children])
+        S = Distances.profile_distance_matrix(profiles, profiles).sum()
         return S / (len(node.children) * len(node.children))
 
     @staticmethod
@@ -137,4 +303,25 @@ class Distances:
         if 0 < du:
             return -3 / 4 * math.log10(du)
         else:
-            return 1.5
\ No newline at end of file
+            return 1.5
+
+    @staticmethod
+    def log_corrected_profile_distances(profiles_1: np.array, profiles_2: np.array) -> np.array:
+        """
+        Log corrected profile distance for many profiles at once, broadcast the same way as profile_distances.
+        Saturated distances (1 - 4/3 d <= 0) are set to 1.5
+        :param profiles_1: a profile or a stack of profiles
+        :param profiles_2: a profile or a stack of profiles
+        :return: array with the broadcast leading shape of the two arguments
+        """
+        return Distances.log_corrected_distances(Distances.profile_distances(profiles_1, profiles_2))
+
+    @staticmethod
+    def log_corrected_distances(distances: np.array) -> np.array:
+        """
+        Log correction of an array of profile distances: - 3/4 log( 1 - 4/3 d), saturated distances are set to 1.5
+        :param distances: the profile distances
+        :return: array of the same shape
+        """
+        du = 1 - (4 / 3) * np.asarray(distances)
+        return np.where(du > 0, -3 / 4 * np.log10(np.where(du > 0, du, 1)), 1.5)
\ No newline at end of file
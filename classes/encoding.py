@@ -0,0 +1,223 @@
+import numpy as np
+
+BASES = 'ACGT'
+
+# code of a gap or of a character without a definite base (N and the IUPAC ambiguity codes)
+GAP = 4
+INVALID = 255
+
+# letter of every code
+LETTERS = np.frombuffer(b'ACGT-', dtype=np.uint8)
+
+# lookup table from ASCII byte to nucleotide code
+NUCLEOTIDE_CODES = np.full(256, INVALID, dtype=np.uint8)
+for code, base in enumerate(BASES):
+    NUCLEOTIDE_CODES[ord(base)] = NUCLEOTIDE_CODES[ord(base.lower())] = code
+NUCLEOTIDE_CODES[ord('U')] = NUCLEOTIDE_CODES[ord('u')] = 3
+for character in '-. NRYKMSWBDHVX?nrykmswbdhvx':
+    NUCLEOTIDE_CODES[ord(character)] = GAP
+
+
+def encode(sequence: str | bytes) -> np.array:
+    """
+    Translates a nucleotide sequence to codes 0-3 for A, C, G, T and 4 for gaps and undetermined bases
+    :param sequence: the sequence
+    :return: uint8 array of codes
+    """
+    if isinstance(sequence, str):
+        sequence = sequence.encode('ascii')
+
+    codes = NUCLEOTIDE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+    if (codes == INVALID).any():
+        raise ValueError(f'invalid character in sequence: {sequence[int(np.argmax(codes == INVALID))]!r}')
+    return codes
+
+
+def profile_from_codes(codes: np.array, out: np.array = None, pseudocount: bool = False) -> np.array:
+    """
+    One-hot (4, L) profile of a coded sequence, gap columns stay zero
+    :param codes: the codes of the sequence
+    :param out: optional zeroed (4, L) array to write the profile into
+    :param pseudocount: use a pseudocount of one per base
+    :return: the profile
+    """
+    if out is None:
+        out = np.zeros(shape=(4, len(codes)))
+
+    columns = np.flatnonzero(codes != GAP)
+    if pseudocount:
+        out[:] = 1
+        out[codes[columns], columns] += 1
+        out /= 5
+    else:
+        out[codes[columns], columns] = 1
+
+    return out
+
+
+def decode_codes(codes: np.array) -> str:
+    """
+    Translates codes back to a sequence, gaps and undetermined bases both become '-'
+    :param codes: the codes of the sequence
+    :return: the sequence
+    """
+    return LETTERS[codes].tobytes().decode('ascii')
+
+
+def decode(profile: np.array) -> str:
+    """
+    Reads the sequence back from a one-hot leaf profile, columns without a base become gaps
+    :param profile: the profile
+    :return: the sequence
+    """
+    return decode_codes(np.where(profile.max(axis=0) > 0, profile.argmax(axis=0), GAP))
+
+
+class ColumnPatterns:
+    """
+    Compressed columns of an alignment. Columns with the same codes in every sequence are kept once, as a pattern
+    with a count, and patterns that are the same for every sequence (all gaps, or one base everywhere) are dropped,
+    since they add nothing to any profile distance.
+
+    The profiles of the kept patterns are scaled by count * width / L, where width is the number of kept patterns.
+    A profile distance divides by 4 times the width of the profiles, so with this scale it is the count weighted sum
+    over the original L columns, which is exactly the distance of the uncompressed profiles. Averages of profiles
+    keep the scale, so nothing downstream has to know about it.
+    """
+    codes: np.array
+    counts: np.array
+    inverse: np.array
+    kept: np.array
+    column_index: np.array
+    scale: np.array
+
+    def __init__(self, codes: np.array) -> None:
+        """
+        :param codes: (N, L) code matrix of the alignment
+        """
+        self.codes, self.inverse, self.counts = np.unique(codes, axis=1, return_inverse=True, return_counts=True)
+        self.inverse = self.inverse.reshape(-1)
+
+        informative = ~(self.codes == self.codes[:1]).all(axis=0)
+        if not informative.any():
+            # every distance is zero, one column keeps the profiles from being empty
+            informative[0] = True
+        self.kept = np.flatnonzero(informative)
+
+        compact = np.full(len(self.counts), -1, dtype=np.intp)
+        compact[self.kept] = np.arange(len(self.kept))
+        self.column_index = compact[self.inverse]
+
+        self.scale = self.counts[self.kept] * len(self.kept) / self.L
+
+    @property
+    def L(self) -> int:
+        return len(self.inverse)
+
+    @property
+    def width(self) -> int:
+        return len(self.kept)
+
+    def profile(self, row: int, out: np.array = None) -> np.array:
+        """
+        Scaled (4, width) profile of a sequence
+        :param row: the row of the sequence in the code matrix
+        :param out: optional zeroed (4, width) array to write the profile into
+        :return: the profile
+        """
+        out = profile_from_codes(self.codes[row, self.kept], out)
+        out *= self.scale
+        return out
+
+    def sequence(self, row: int) -> str:
+        """
+        The full sequence of a row, gaps and undetermined bases both become '-'
+        :param row: the row of the sequence in the code matrix
+        :return: the sequence
+        """
+        return decode_codes(self.codes[row, self.inverse])
+
+    def expand(self, values: np.array) -> np.array:
+        """
+        Spreads unscaled per-pattern values over the original columns, with zeros for the dropped columns
+        :param values: array with the kept patterns along the first axis
+        :return: array with the L original columns along the first axis
+        """
+        result = np.zeros((self.L,) + values.shape[1:], dtype=values.dtype)
+        mask = self.column_index >= 0
+        result[mask] = values[self.column_index[mask]]
+        return result
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words: np.array) -> np.array:
+        """
+        Number of set bits of every word
+        """
+        return np.bitwise_count(words)
+else:
+    _BYTE_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(words: np.array) -> np.array:
+        """
+        Number of set bits of every word, through a table of the bits of every byte
+        """
+        return _BYTE_BITS[words.view(np.uint8)].reshape(words.shape + (-1,)).sum(axis=-1)
+
+
+class PackedSequences:
+    """
+    Leaf sequences as three bit planes packed into 64 bit words: the high and the low bit of the base code and a gap
+    mask. Two one-hot leaf profiles differ by 2 in a column where both have a different base and by 1 where only one
+    has a gap, so their profile distance is (2 * base mismatches + gap mismatches) / (4 L), two XOR and popcount
+    passes over L / 64 words instead of a pass over 4 L floats.
+    """
+    BATCH_WORDS = 1 << 15
+
+    bits: np.array
+    L: int
+
+    def __init__(self, N: int, L: int) -> None:
+        """
+        :param N: number of sequences
+        :param L: length of the sequences
+        """
+        self.bits = np.zeros((N, 3, -(-L // 64)), dtype=np.uint64)
+        self.L = L
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def set(self, row: int, codes: np.array) -> None:
+        """
+        Packs the codes of a sequence into a row
+        :param row: the row
+        :param codes: the codes of the sequence
+        """
+        planes = np.stack([(codes >> 1) & 1, codes & 1, codes == GAP]).astype(bool)
+        packed = np.packbits(planes, axis=1)
+        self.bits[row].view(np.uint8)[:, :packed.shape[1]] = packed
+
+    def distances(self, row: int, rows: np.array) -> np.array:
+        """
+        Profile distance between the leaf of one row and the leaves of many rows
+        :param row: the row of the leaf
+        :param rows: the rows to compare with
+        :return: array of distances, in the order of rows
+        """
+        high, low, gap = self.bits[row]
+        result = np.empty(len(rows))
+        step = max(1, self.BATCH_WORDS // self.bits[0].size)
+
+        for start in range(0, len(rows), step):
+            other = self.bits[rows[start:start + step]]
+            gaps = other[:, 2] | gap
+            bases = ((other[:, 0] ^ high) | (other[:, 1] ^ low)) & ~gaps
+            gaps ^= other[:, 2] & gap
+            result[start:start + step] = 2 * popcount(bases).sum(axis=1, dtype=np.int64) + \
+                popcount(gaps).sum(axis=1, dtype=np.int64)
+
+        return result / (4 * self.L)
+
+    def distance(self, row_1: int, row_2: int) -> float:
+        return float(self.distances(row_1, np.array([row_2]))[0])
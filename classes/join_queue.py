@@ -0,0 +1,50 @@
+from __future__ import annotations
+import heapq
+from typing import Iterable
+from .node import Node
+
+
+class JoinQueue:
+    """
+    Min-heap of nodes ordered by the distance of their best known join. Entries are (distance, generation, node id)
+    tuples, so the heap never compares nodes and never sees a distance change after insertion. Pushing a node again
+    bumps its generation, its older entries are then stale and are dropped when they reach the top, as are entries of
+    nodes that are no longer active.
+    """
+
+    def __init__(self, nodes: Iterable[Node] = ()) -> None:
+        self.heap: list[tuple[float, int, int]] = []
+        self.nodes: dict[int, Node] = {}
+        self.generations: dict[int, int] = {}
+
+        for node in nodes:
+            self.nodes[node.id] = node
+            self.generations[node.id] = 0
+            self.heap.append((node.best_known.distance, 0, node.id))
+        heapq.heapify(self.heap)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, node: Node) -> None:
+        """
+        Adds a node with the current distance of its best known join, older entries of the node become stale
+        :param node: the node to add
+        """
+        generation = self.generations.get(node.id, -1) + 1
+        self.generations[node.id] = generation
+        self.nodes[node.id] = node
+        heapq.heappush(self.heap, (node.best_known.distance, generation, node.id))
+
+    def pop(self) -> Node | None:
+        """
+        Removes and returns the active node with the closest best known join
+        :return: the node, or None when no active node is left
+        """
+        while self.heap:
+            _, generation, node_id = heapq.heappop(self.heap)
+            node = self.nodes[node_id]
+            if generation == self.generations[node_id] and node.is_active:
+                return node
+
+        return None
@@ -1,42 +1,127 @@
 from __future__ import annotations
 from functools import total_ordering
+from itertools import count
+from typing import Iterator
 import numpy as np
+from .profile_store import ProfileStore
+from .encoding import encode, decode, profile_from_codes
+
+# source of the integer ids that identify nodes in hashes and comparisons
+_node_ids = count()
 
 
 class BestKnown:
+    __slots__ = ('node', 'distance')
+
     node: Node
     distance: float
 
     def __init__(self) -> None:
+        self.node = None
         self.distance = 1
 
 
 @total_ordering
 class Node:
+    __slots__ = ('id', 'children', 'parent', '_alignment', 'label', 'is_leaf', 'is_active', 'branch_length',
+                 'support_value', 'best_known', 'store', 'index', 'top_hits', 'stale')
+
+    id: int
+    label: str
+    store: ProfileStore
+    index: int
 
-    def __init__(self, name: str, alignment: str, profile: np.array = None, is_leaf: bool = True) -> None:
+    def __init__(self, name: str, alignment: str | None, profile: np.array = None, is_leaf: bool = True,
+                 store: ProfileStore = None, index: int = None) -> None:
+        self.id = next(_node_ids)
         self.children = []
         self.parent = None
-        self.alignment = alignment
-        self.name = name
+        self._alignment = alignment
+        self.label = name
         self.is_leaf = is_leaf
         self.is_active = True
         self.branch_length = 1
         self.support_value = 0
         self.best_known = BestKnown()
+        self.stale = False
+
+        # the parser encodes leaves straight into their slot and passes the index along
+        if index is None:
+            if is_leaf and profile is None:
+                profile = self.form_profile()
+
+            # nodes created outside a tree get a store of their own, Tree moves them into the shared one
+            if store is None:
+                store = ProfileStore(1, len(profile[0]))
+
+            index = store.allocate() if profile is None else store.add(profile)
+
+        self.store = store
+        self.index = index
+
+        self.top_hits = {}
+
+    @property
+    def name(self) -> str:
+        """
+        Leaves are named by their label. Internal nodes without a label are named after the leaves below them, this
+        name is only built when asked for (e.g. for logging), so joins and interchanges never touch strings
+        """
+        if self.is_leaf or self.label:
+            return self.label
+        return "".join(leaf.label for leaf in self.leaves())
 
-        if is_leaf:
-            self.profile = self.form_profile()
-        else:
-            self.profile = profile
+    @name.setter
+    def name(self, name: str) -> None:
+        self.label = name
 
-        self.top_hits = []
+    @property
+    def alignment(self) -> str | None:
+        """
+        The sequence of a leaf. When the parser did not keep it, it is read back from the profile, with gaps for the
+        columns without a definite base
+        """
+        if self._alignment is None and self.is_leaf:
+            # the leaves of a compact store are its first rows, in the order of the code matrix
+            if self.store.patterns is not None:
+                return self.store.patterns.sequence(self.index)
+            return decode(self.profile)
+        return self._alignment
+
+    @alignment.setter
+    def alignment(self, alignment: str) -> None:
+        self._alignment = alignment
+
+    @property
+    def profile(self) -> np.array:
+        """
+        The profile of the node, rebuilt first when an interchange below the node made it stale
+        """
+        if self.stale:
+            self.refresh_profile()
+        return self.store.profiles[self.index]
+
+    @profile.setter
+    def profile(self, profile: np.array) -> None:
+        self.store.profiles[self.index] = profile
+        self.store.touch(self.index)
+
+    @property
+    def profile_version(self) -> int:
+        """
+        Number of times the profile of the node was rewritten, a stale profile is rebuilt first
+        """
+        if self.stale:
+            self.refresh_profile()
+        return int(self.store.versions[self.index])
 
     def _is_valid_operand(self, other: object) -> bool:
         return hasattr(other, "best_known") and hasattr(self, "best_known")
 
     def __eq__(self, other: Node) -> bool:
-        return self.name == other.name
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.id == other.id
 
     def __lt__(self, other: ...) -> bool:
         if not self._is_valid_operand(other):
@@ -44,7 +129,7 @@ class Node:
         return self.best_known.distance < other.best_known.distance
 
     def __hash__(self) -> int:
-        return hash(self.name)
+        return self.id
 
     def __repr__(self) -> str:
         return f'<Node:{self.name}>'
@@ -54,12 +139,30 @@ class Node:
         Update the name of the node after an interchange
         :return: the new name of the node
         """
-        new_name = ""
-        for child in self.children:
-            child.rename()
-            new_name += child.name
+        return self.name
 
-        return new_name
+    def leaves(self) -> list[Node]:
+        """
+        Collects the leaves below the node from left to right, without recursion
+        :return: list of leaves
+        """
+        result = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                result.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return result
+
+    def move_to(self, store: ProfileStore) -> None:
+        """
+        Copies the profile of the node into a slot of another store and uses that slot from then on
+        :param store: the store to move to
+        """
+        self.index = store.add(self.profile)
+        self.store = store
 
     def add_child(self, node: Node) -> None:
         """
@@ -73,20 +176,31 @@ class Node:
         Construct newick format of the node
         :return: newick string
         """
-        result = ""
-
-        if self.support_value and not self.is_leaf:
-            support_val = self.support_value
-        else:
-            support_val = ""
+        return "".join(self.newick_tokens())
 
-        if self.is_leaf:
-            result += f'{self.name}:{self.branch_length}'
-        else:
-            self.children.sort(key=lambda x: x.is_leaf, reverse=True)
-            result += f'({",".join([child.newick() for child in self.children])}){support_val}:{self.branch_length}'
+    def newick_tokens(self) -> Iterator[str]:
+        """
+        The pieces of the newick string of the node, in order. The subtree is walked with an explicit stack, so deep
+        trees never reach the recursion limit, and leaves are written before subtrees without reordering the children
+        :return: iterator of strings
+        """
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+            elif item.is_leaf:
+                yield f'{item.name}:{item.branch_length}'
+            else:
+                support_val = item.support_value if item.support_value else ""
+                yield '('
+                stack.append(f'){support_val}:{item.branch_length}')
 
-        return result
+                children = sorted(item.children, key=lambda x: x.is_leaf, reverse=True)
+                for i, child in enumerate(reversed(children)):
+                    if i:
+                        stack.append(',')
+                    stack.append(child)
 
     @staticmethod
     def join_profiles(profile1: np.array, profile2: np.array) -> np.array:
@@ -104,29 +218,46 @@ class Node:
         :param psuesdocount: bool - use psuedocount
         :return: profile
         """
-        sequences = [self.alignment]
-        base_value = 4 if psuesdocount else 0
+        return profile_from_codes(encode(self.alignment), pseudocount=psuesdocount)
 
-        bases = ['A', 'C', 'G', 'T']
-
-        if psuesdocount:
-            profile = np.ones(shape=(4, len(sequences[0])))
-        else:
-            profile = np.zeros(shape=(4, len(sequences[0])))
+    def recompute_profile(self) -> None:
+        """
+        Recomputes the profile of a node when a node is interchanged with another node
+        """
+        for child in self.children:
+            if child.stale:
+                child.refresh_profile()
 
-        for i in range(0, len(sequences)):
-            for j in range(0, len(sequences[i])):
-                if sequences[i][j] == " " or sequences[i][j] == "-":
-                    continue
-                profile[bases.index(sequences[i][j])][j] += 1
+        self.store.average(self.index, [node.index for node in self.children])
+        self.stale = False
 
-        return profile / (len(sequences) + base_value)
+    def mark_stale(self) -> None:
+        """
+        Marks the profiles of the node and of its ancestors as stale, they are rebuilt when they are read next. The
+        ancestors of a stale node are always stale, so the walk stops at the first node that already is
+        """
+        node = self
+        while node and not node.stale:
+            node.stale = True
+            node.store.touch(node.index)
+            node = node.parent
 
-    def recompute_profile(self) -> None:
+    def refresh_profile(self) -> None:
         """
-        Recomputes the profile of a node when a node is interchanged with another node
+        Rebuilds the stale profiles at and below the node, children before their parents. Only the stale paths are
+        visited, so the cost follows the interchanges since the last read and not the size of the subtree
         """
-        self.profile = np.mean(np.array([node.profile for node in self.children]), axis=0)
+        order = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.stale:
+                order.append(node)
+                stack.extend(node.children)
+
+        for node in reversed(order):
+            node.store.average(node.index, [child.index for child in node.children])
+            node.stale = False
 
     def get_sibling(self) -> Node:
         """
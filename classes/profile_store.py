@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from .encoding import ColumnPatterns, PackedSequences
+
+
+class ProfileStore:
+    """
+    Owns the profiles of all nodes of a tree in one preallocated (capacity, 4, L) block. A node only keeps the index
+    of its slot, joins write the averaged profile straight into the slot of the new parent. Next to every profile the
+    store keeps the up-distance of the node, NaN until it is computed and again whenever the profile is rewritten,
+    and a version that counts the rewrites, so memos of distances can tell an old profile from the current one.
+    A store of a compressed alignment keeps its column patterns, its profiles then cover the kept patterns only.
+    A store filled by the parser also keeps the leaves bit-packed, in the same rows as their profiles.
+    """
+    profiles: np.array
+    up_distances: np.array
+    versions: np.array
+    size: int
+    patterns: ColumnPatterns | None
+    packed: PackedSequences | None
+
+    def __init__(self, capacity: int, L: int, dtype: type = np.float64) -> None:
+        self.profiles = np.zeros(shape=(capacity, 4, L), dtype=dtype)
+        self.up_distances = np.full(capacity, np.nan)
+        self.versions = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.patterns = None
+        self.packed = None
+
+    @classmethod
+    def for_leaves(cls, N: int, L: int, dtype: type = np.float64) -> 'ProfileStore':
+        """
+        Creates a store that fits N leaves and the N - 1 internal nodes created by joining them
+        :param N: number of leaves
+        :param L: length of the alignment
+        :param dtype: float type of the profiles
+        :return: empty store
+        """
+        return cls(max(2 * N - 1, 1), L, dtype)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.profiles)
+
+    @property
+    def L(self) -> int:
+        return self.profiles.shape[2]
+
+    def allocate(self) -> int:
+        """
+        Reserves the next free slot
+        :return: index of the slot
+        """
+        if self.size == self.capacity:
+            raise IndexError(f'profile store is full ({self.capacity} slots)')
+
+        self.size += 1
+        return self.size - 1
+
+    def add(self, profile: np.array) -> int:
+        """
+        Copies a profile into the next free slot
+        :param profile: the profile to store
+        :return: index of the slot
+        """
+        index = self.allocate()
+        self.profiles[index] = profile
+        self.touch(index)
+        return index
+
+    def touch(self, index: int) -> None:
+        """
+        Invalidates what is known about the profile of a slot after it was rewritten
+        :param index: the slot
+        """
+        self.up_distances[index] = np.nan
+        self.versions[index] += 1
+
+    def average(self, index: int, indices: list[int]) -> None:
+        """
+        Overwrites a slot with the average of other slots, without allocating a temporary
+        :param index: the slot to write
+        :param indices: the slots to average
+        """
+        profile = self.profiles[index]
+        self.touch(index)
+        if len(indices) == 1:
+            profile[:] = self.profiles[indices[0]]
+            return
+
+        np.add(self.profiles[indices[0]], self.profiles[indices[1]], out=profile)
+        for i in indices[2:]:
+            profile += self.profiles[i]
+        profile /= len(indices)
+
+    def take(self, indices: np.array) -> np.array:
+        """
+        Gathers the profiles of several slots into one stack
+        :param indices: the slots to gather
+        :return: (len(indices), 4, L) array
+        """
+        return self.profiles[indices]
@@ -0,0 +1,164 @@
+from __future__ import annotations
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, TextIO
+import functools
+import json
+import threading
+import time
+import numpy as np
+from .node import Node
+from .distances import Distances
+
+
+class Profiler:
+    """
+    Phase timers and call counters of a run. While disabled, phase only yields and the Distances methods are the
+    original functions, so the instrumentation costs nothing. enable wraps every Distances method in a wrapper that
+    counts its calls and the profile columns it touched (columns per compared pair times the number of pairs); nested
+    calls are counted by every method they pass through, and a method with a <name>_width method counts the columns
+    that one returns, e.g. none for a cached up-distance. The numbers of builds in parallel threads add up
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.phases: dict[str, float] = {}
+        self.calls: Counter[str] = Counter()
+        self.columns: Counter[str] = Counter()
+        self.counters: dict[str, int] = {}
+        self._originals: dict[str, staticmethod] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, distances: bool = True) -> None:
+        """
+        Starts timing the phases and counting the calls of the Distances methods
+        :param distances: whether to count the calls, without the wrappers only the phases are timed
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        if not distances:
+            return
+        for name, method in list(vars(Distances).items()):
+            if isinstance(method, staticmethod):
+                self._originals[name] = method
+                setattr(Distances, name, staticmethod(self._counted(name, method.__func__)))
+
+    def disable(self) -> None:
+        """
+        Restores the original Distances methods, the collected numbers are kept
+        """
+        for name, method in self._originals.items():
+            setattr(Distances, name, method)
+        self._originals.clear()
+        self.enabled = False
+
+    def _counted(self, name: str, function):
+        width = getattr(self, f'{name}_width', self.width)
+
+        @functools.wraps(function)
+        def counted(*args, **kwargs):
+            # the width is taken before the call, which may fill a cache
+            columns = width(args)
+            result = function(*args, **kwargs)
+            columns *= result.size if isinstance(result, np.ndarray) else 1
+            with self._lock:
+                self.calls[name] += 1
+                self.columns[name] += columns
+            return result
+
+        return counted
+
+    @staticmethod
+    def width(args: tuple) -> int:
+        """
+        Number of columns of one compared pair, from the first profile, node or sequence among the arguments
+        :param args: the arguments of a Distances method
+        :return: number of columns, 0 when there is none
+        """
+        for arg in args:
+            if isinstance(arg, np.ndarray) and arg.ndim >= 2:
+                return arg.shape[-1]
+            if isinstance(arg, Node):
+                return arg.store.profiles.shape[-1] if arg.store is not None else len(arg.profile[0])
+            if isinstance(arg, str):
+                return len(arg)
+            if isinstance(arg, list) and arg and isinstance(arg[0], Node):
+                return Profiler.width(arg[:1])
+        return 0
+
+    @staticmethod
+    def up_distance_width(args: tuple) -> int:
+        """
+        Number of columns of an up_distance call, none for a leaf or an up-distance cached in the profile store
+        :param args: the arguments of Distances.up_distance
+        :return: number of columns
+        """
+        node = args[0]
+        if node.is_leaf or not np.isnan(node.store.up_distances[node.index]):
+            return 0
+        return Profiler.width(args)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times a stage of the run, a phase entered again adds to its time
+        :param name: name of the phase
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, **counters: int) -> None:
+        """
+        Records counters of the run, e.g. the number of joins
+        """
+        self.counters.update(counters)
+
+    def summary(self) -> dict:
+        """
+        :return: dict of the phase times in seconds, the counters, and the calls and columns of every method
+        """
+        return {'phases': dict(self.phases), 'counters': dict(self.counters),
+                'distances': {name: {'calls': self.calls[name], 'columns': self.columns[name]}
+                              for name, _ in self.calls.most_common()}}
+
+    def report(self, file: TextIO) -> None:
+        """
+        Writes the summary as a table
+        :param file: the file handle
+        """
+        summary = self.summary()
+        total = sum(summary['phases'].values())
+        file.write(f'{"phase":32}{"seconds":>12}{"share":>9}\n')
+        for name, seconds in summary['phases'].items():
+            file.write(f'{name:32}{seconds:12.4f}{100 * seconds / total if total else 0:8.1f}%\n')
+        file.write(f'{"total":32}{total:12.4f}\n\n')
+
+        file.write(f'{"counter":32}{"value":>12}\n')
+        for name, value in summary['counters'].items():
+            file.write(f'{name:32}{value:12}\n')
+
+        file.write(f'\n{"Distances method":32}{"calls":>12}{"columns":>16}\n')
+        for name, numbers in summary['distances'].items():
+            file.write(f'{name:32}{numbers["calls"]:12}{numbers["columns"]:16}\n')
+
+    def write_json(self, path: str) -> None:
+        """
+        Writes the summary as JSON
+        :param path: the output file
+        """
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+
+# the profiler of the run, enabled by the --profile flag of fasttree.py
+profiler = Profiler()
@@ -1,16 +1,30 @@
+from __future__ import annotations
+from typing import Iterable
 from .node import Node
+from .distances import Distances
 import numpy as np
 
 
 class TotalProfile:
+    """
+    Average profile of the active nodes and the sum of their up-distances. Joins update both incrementally, every
+    recompute_interval updates they are recomputed from the active nodes to remove accumulated rounding drift,
+    recomputes counts those full recomputes including the first one.
+    version changes with every update, so values derived from the total profile can tell when they are stale
+    """
     active: int
     total_profile: np.array
+    up_distance_sum: float
+    version: int
 
-    def __init__(self, nodes: list) -> None:
+    def __init__(self, nodes: Iterable[Node], recompute_interval: int = 200) -> None:
         self.nodes = nodes
+        self.recompute_interval = recompute_interval
+        self.version = 0
+        self.recomputes = 0
         self.recompute(nodes)
 
-    def recompute(self, active_nodes: list) -> None:
+    def recompute(self, active_nodes: Iterable[Node]) -> None:
         """
         recomputes the total profile from all the active nodes
         :param active_nodes: list of active nodes
@@ -18,11 +32,52 @@ class TotalProfile:
         self.nodes = active_nodes
         profile = 0
         active = 0
+        up_distance_sum = 0
 
         for node in self.nodes:
             profile += node.profile
+            up_distance_sum += Distances.up_distance(node)
             active += 1
 
         self.active = active
+        self.profile_sum = profile
+        self.up_distance_sum = up_distance_sum
+        self.updates = 0
+        self.version += 1
+        self.recomputes += 1
         self.total_profile = profile / active if active != 0 else 0
 
+    def on_join(self, node_1: Node, node_2: Node, joined_node: Node) -> None:
+        """
+        Replaces two joined nodes by their parent
+        :param node_1: the first joined node
+        :param node_2: the second joined node
+        :param joined_node: the new parent
+        """
+        self.profile_sum += joined_node.profile
+        self.profile_sum -= node_1.profile
+        self.profile_sum -= node_2.profile
+        self.up_distance_sum += Distances.up_distance(joined_node) - Distances.up_distance(node_1) - \
+                                Distances.up_distance(node_2)
+        self.active -= 1
+        self._updated()
+
+    def on_switch(self, node: Node, old_profile: np.array, old_up_distance: float) -> None:
+        """
+        Accounts for an active node whose profile changed in place, e.g. after an interchange below it
+        :param node: the changed node
+        :param old_profile: the profile of the node before the change
+        :param old_up_distance: the up-distance of the node before the change
+        """
+        self.profile_sum += node.profile
+        self.profile_sum -= old_profile
+        self.up_distance_sum += Distances.up_distance(node) - old_up_distance
+        self._updated()
+
+    def _updated(self) -> None:
+        self.updates += 1
+        if self.updates >= self.recompute_interval:
+            self.recompute(self.nodes)
+        else:
+            self.version += 1
+            self.total_profile = self.profile_sum / self.active if self.active != 0 else 0
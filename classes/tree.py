@@ -1,27 +1,81 @@
 from __future__ import annotations
-from queue import PriorityQueue
+from typing import TextIO
 from .node import Node
 from .distances import Distances
 import logging
-import random
+import time
+import numpy as np
 from .total_profile import TotalProfile
-
-logger = logging.getLogger('FastTree')
+from .profile_store import ProfileStore
+from .active_set import ActiveSet
+from .distance_cache import OutDistanceCache, LogDistanceCache
+from .join_queue import JoinQueue
+from .bootstrap import bootstrap_support
+from .context import BuildContext
 
 
 class Tree:
     root: Node
     tp: TotalProfile
 
-    def __init__(self, nodes: list[Node], m: int, N: int, L: int, bootstrap=False, bootstrap_round=50) -> None:
+    def __init__(self, nodes: list[Node], m: int, N: int, L: int = None, bootstrap=False,
+                 bootstrap_round=50, close_ratio: float = 0.75, refresh_ratio: float = 0.8,
+                 context: BuildContext = None) -> None:
+        """
+        :param nodes: the leaves
+        :param m: length of the top-hits lists
+        :param N: number of leaves
+        :param L: alignment length, read from the first profile if not given
+        :param bootstrap: whether to bootstrap the splits
+        :param bootstrap_round: number of bootstrap rounds
+        :param close_ratio: the closest close_ratio * 2m of the 2m candidates of a seed reuse the candidates for their
+            own top hits
+        :param refresh_ratio: a joined node is compared to all active nodes when fewer than this fraction of m of the
+            top hits of its children are still active
+        :param context: the context of the build, a new unnamed context if not given
+        """
+        self.context = context if context is not None else BuildContext()
+        self.logger = self.context.logger
         self.nodes = nodes.copy()
-        self.active_nodes = nodes.copy()
         self.m = m
+        self.close_ratio = close_ratio
+        self.refresh_ratio = refresh_ratio
         self.N = N
-        self.L = L
+        self.L = L if L is not None else len(nodes[0].profile[0])
+        self.store = self.shared_store(nodes)
+        self.active_nodes = ActiveSet(nodes, self.store.capacity)
+        self.tp = TotalProfile(self.active_nodes)
+        self.out_distances = OutDistanceCache()
+        self.log_distances = LogDistanceCache()
+        self.join_queue = None
+        # reverse indices of the nodes that (may) have a node as best known join or among their top hits, so a join
+        # only visits the nodes that pointed at the joined nodes. Entries are not removed when a node changes its
+        # mind, they are checked when they are used
+        self.best_known_holders: dict[Node, list[Node]] = {}
+        self.top_hit_holders: dict[Node, list[Node]] = {}
         self.do_bootstrap = bootstrap
         self.bootstrap_rounds = bootstrap_round
         self.joins = 0
+        self.seeds = 0
+        self.refreshes = 0
+        self.switches = 0
+
+    @staticmethod
+    def shared_store(nodes: list[Node]) -> ProfileStore:
+        """
+        Finds or creates the profile store for the tree. Leaves parsed together already share a store with room for
+        every join, otherwise the leaf profiles are copied into a new store
+        :param nodes: the leaves of the tree
+        :return: store holding the profiles of the leaves with a free slot for every join
+        """
+        store = nodes[0].store
+        if all(node.store is store for node in nodes) and store.capacity - store.size >= len(nodes) - 1:
+            return store
+
+        store = ProfileStore.for_leaves(len(nodes), len(nodes[0].profile[0]), nodes[0].profile.dtype)
+        for node in nodes:
+            node.move_to(store)
+        return store
 
     def to_newick(self) -> str:
         """
@@ -30,11 +84,32 @@ class Tree:
         """
         return f"{self.root.newick()};"
 
+    def write_newick(self, file: TextIO, chunk_size: int = 1 << 16) -> None:
+        """
+        Writes the newick representation of the tree to a file handle, in chunks of about chunk_size characters
+        :param file: the file handle
+        :param chunk_size: number of characters collected before a write
+        """
+        chunk = []
+        size = 0
+        for token in self.root.newick_tokens():
+            chunk.append(token)
+            size += len(token)
+            if size >= chunk_size:
+                file.write("".join(chunk))
+                chunk.clear()
+                size = 0
+
+        chunk.append(";")
+        file.write("".join(chunk))
+
     def set_total_profile(self, total_profile: TotalProfile) -> None:
         """
-        Sets the total profile
+        Sets the total profile, it is kept up to date on every join from then on. It is rebound to the active set of
+        the tree, so its periodic recomputes sum the active nodes and not the collection it was created with
         :param total_profile: total profile to set
         """
+        total_profile.recompute(self.active_nodes)
         self.tp = total_profile
 
     def save(self, path: str) -> None:
@@ -43,7 +118,16 @@ class Tree:
         :param path: the path of the file to save
         """
         with open(path, 'w') as file:
-            file.write(self.to_newick())
+            self.write_newick(file)
+
+    def neighbor_join_distance(self, node_1: Node, node_2: Node) -> float:
+        """
+        Neighbor-joining distance between two nodes against the current active set, with cached out-distances
+        :param node_1: the first node
+        :param node_2: the second node
+        :return: the neighbor-joining distance
+        """
+        return Distances.neighbor_join_distance(node_1, node_2, self.active_nodes, self.tp, self.out_distances)
 
     def join_nodes(self, node_1: Node, node_2: Node) -> Node:
         """
@@ -52,89 +136,108 @@ class Tree:
         :param node_2: the second node to join
         :return:
         """
-        joined_node = Node(node_1.name + node_2.name, "", Node.join_profiles(node_1.profile, node_2.profile), False)
+        joined_node = Node("", "", is_leaf=False, store=self.store)
         joined_node.add_child(node_1)
         joined_node.add_child(node_2)
+        joined_node.recompute_profile()
         node_1.parent = joined_node
         node_2.parent = joined_node
         node_1.is_active = False
         node_2.is_active = False
 
-        # remove from active
+        # replace the joined nodes by their parent in the active set and the total profile
         self.active_nodes.remove(node_1)
         self.active_nodes.remove(node_2)
+        self.active_nodes.add(joined_node)
+        self.tp.on_join(node_1, node_2, joined_node)
+        self.out_distances.discard(node_1)
+        self.out_distances.discard(node_2)
 
-        children = list(set(list(node_1.top_hits.keys()) + list(node_2.top_hits.keys())))
+        # nodes hash by their global id, a dict keeps the order independent of other trees built in the process
+        children = list(dict.fromkeys([*node_1.top_hits, *node_2.top_hits]))
         self.set_top_hits_node(joined_node, children, joined_node.children)
         self.joins += 1
-        self.active_nodes.append(joined_node)
         self.nodes.append(joined_node)
 
-        if len(self.active_nodes) > 1:
-            if joined_node.best_known.node not in self.active_nodes:
-                min_distance = float('inf')
-                for node in self.active_nodes:
-                    if Distances.neighbor_join_distance(joined_node, node,
-                                                        self.active_nodes,
-                                                        self.tp) < min_distance and node != joined_node:
-                        joined_node.best_known.node = node
-
-        # check the top_hits lists of all other nodes for the removed nodes and replace with active ancestor
-        for node in self.active_nodes:
-            # Check top-hits
-            if node_1 in node.top_hits:
-                del node.top_hits[node_1]
-            if node_2 in node.top_hits:
-                del node.top_hits[node_2]
-            if node_1 in node.top_hits or node_2 in node.top_hits and node != joined_node:
-                node.top_hits[joined_node] = Distances.neighbor_join_distance(joined_node, node, self.active_nodes,
-                                                                              self.tp)
+        # none of the compared nodes was closer than the default, the closest active node is its best known join
+        if len(self.active_nodes) > 1 and joined_node.best_known.node not in self.active_nodes:
+            others = [node for node in self.active_nodes if node != joined_node]
+            distances = self.neighbor_join_distances(joined_node, others)
+            best = int(np.argmin(distances))
+            self.set_best_known(joined_node, others[best], float(distances[best]))
+
+        # the best known joins that pointed at the removed nodes point at their parent now
+        for node in self.holders(self.best_known_holders, node_1, node_2):
+            if node.best_known.node is node_1 or node.best_known.node is node_2:
+                self.set_best_known(node, joined_node, self.neighbor_join_distance(joined_node, node))
+
+        # the joined nodes are replaced by their parent in the top_hits lists of the other nodes, so the lists keep
+        # their length and the children of a later join still have enough active top hits to compare with
+        holders = [node for node in self.holders(self.top_hit_holders, node_1, node_2)
+                   if node_1 in node.top_hits or node_2 in node.top_hits]
+        distances = self.neighbor_join_distances(joined_node, holders).tolist() if holders else []
+        for node, distance in zip(holders, distances):
+            node.top_hits.pop(node_1, None)
+            node.top_hits.pop(node_2, None)
+            if joined_node not in node.top_hits:
+                self.offer_top_hit(node, joined_node, distance)
+            if distance < node.best_known.distance:
+                self.set_best_known(node, joined_node, distance)
 
         return joined_node
 
+    def holders(self, index: dict[Node, list[Node]], node_1: Node, node_2: Node) -> list[Node]:
+        """
+        Takes the entries of two joined nodes out of a reverse index
+        :param index: best_known_holders or top_hit_holders
+        :param node_1: the first joined node
+        :param node_2: the second joined node
+        :return: the active nodes that were listed for either node, once each in the order they were listed
+        """
+        listed = dict.fromkeys([*index.pop(node_1, ()), *index.pop(node_2, ())])
+        return [node for node in listed if node in self.active_nodes]
+
+    def set_top_hits_of(self, node: Node, top_hits: dict[Node, float]) -> None:
+        """
+        Sets the top hits of a node and lists the node as holder of each of them
+        :param node: the node
+        :param top_hits: its top hits and their distances
+        """
+        node.top_hits = top_hits
+        for hit in top_hits:
+            self.top_hit_holders.setdefault(hit, []).append(node)
+
     def construct_initial_topology(self) -> None:
         """
         Constructs the initial topology of the tree using the top-hits heuristic
         and neighbor-joining criterion
         """
-        # construct priority queue to find the m best best-know
-        best_knows = PriorityQueue()
-        any(best_knows.put(node) for node in self.active_nodes)
-        m_best_known = [best_knows.get() for _ in range(self.m)]
+        # queue of the nodes by their best known join, the m best joins are taken out and rescored after every join
+        self.join_queue = JoinQueue(self.active_nodes)
+        m_best_known = []
 
         while len(self.active_nodes) > 1:
 
-            # Check that all the best joins show to an active node after a join
-            for node in self.active_nodes:
-                if node.best_known.node not in self.active_nodes:
-                    node.best_known.node = node.best_known.node.parent
-                    node.best_known.distance = Distances.neighbor_join_distance(node.best_known.node, node,
-                                                                                self.active_nodes, self.tp)
-            for node in m_best_known:
-                if not node.is_active:
-                    m_best_known.remove(node)
-
+            m_best_known = [node for node in m_best_known if node.is_active]
             while len(m_best_known) < min(self.m, len(self.active_nodes)):
-                temp = best_knows.get()
-                if temp.is_active:
-                    m_best_known.append(temp)
+                node = self.join_queue.pop()
+                if node is None:
+                    break
+                if node not in m_best_known:
+                    m_best_known.append(node)
 
             # recompute the neighbor joining criterion
             best = None
             least_distance = float('inf')
             for node in m_best_known:
-                if node.is_active:
-                    distance = Distances.neighbor_join_distance(node, node.best_known.node, self.active_nodes, self.tp)
-                    node.best_known.distance = distance
-                    if distance < least_distance:
-                        best = node
-                        least_distance = distance
-                else:
-                    m_best_known.remove(node)
-                    m_best_known.append(best_knows.get())
+                distance = self.neighbor_join_distance(node, node.best_known.node)
+                self.set_best_known(node, node.best_known.node, distance)
+                if distance < least_distance:
+                    best = node
+                    least_distance = distance
 
             # log initial best nodes
-            logger.debug(f'{best=}\t, {len(m_best_known)}\t{len(self.active_nodes)}')
+            self.logger.debug('best=%s\t, %s\t%s', best, len(m_best_known), len(self.active_nodes))
 
             # perform hill climbing for the current two best nodes
             node_1 = best
@@ -145,39 +248,72 @@ class Tree:
 
             # Local Hill Climbing
             for node in node_1.top_hits:
-                distance = Distances.neighbor_join_distance(node_1, node, self.active_nodes, self.tp)
+                distance = self.neighbor_join_distance(node_1, node)
                 if distance < least_distance:
                     selected_1 = node_1
                     selected_2 = node
                     least_distance = distance
 
             for node in node_2.top_hits:
-                distance = Distances.neighbor_join_distance(node, node_2, self.active_nodes, self.tp)
+                distance = self.neighbor_join_distance(node, node_2)
                 if distance < least_distance:
                     selected_1 = node
                     selected_2 = node_2
                     least_distance = distance
 
             # log final best nodes after hill climbing
-            logger.debug(f"joining nodes: {selected_1.name} -  {selected_2.name}")
+            self.logger.debug("joining nodes: %s -  %s", selected_1, selected_2)
 
             joined_node = self.join_nodes(selected_1, selected_2)
-            best_knows.put(joined_node)
+            self.join_queue.push(joined_node)
 
         # save the last remaining active node as the root of the tree
         self.root = self.active_nodes.pop()
-        logger.debug(f'Initial topology:\t{self.to_newick()}')
+        self.join_queue = None
+        self.logger.debug('out-distance cache: %s hits, %s misses (%.1f%% hit rate)', self.out_distances.hits,
+                          self.out_distances.misses, 100 * self.out_distances.hit_rate)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('Initial topology:\t%s', self.to_newick())
 
-    def nearest_neighbor_interchange(self) -> None:
+    def nearest_neighbor_interchanges(self, rounds: int) -> list[tuple[int, float]]:
         """
-        Perform nearest neighbor interchange to evaluate if a split is favorable
+        Runs up to the given number of rounds of nearest neighbor interchanges. The first round visits every node, the
+        later rounds only the nodes near a switch of the round before, and the rounds stop once one makes no switch
+        :param rounds: the maximum number of rounds
+        :return: the number of switches and the seconds of every round
         """
-        queue = [node for node in self.nodes if node.is_leaf]
-
-        # for all nodes check if they support a split in postorder
-        while queue:
-            current_node = queue.pop()
-            # because all nodes have two children the only condition is to have 3 parents
+        statistics = []
+        dirty = None
+        for i in range(rounds):
+            start = time.perf_counter()
+            switches, dirty = self.nearest_neighbor_interchange(dirty)
+            seconds = time.perf_counter() - start
+
+            statistics.append((switches, seconds))
+            self.logger.info('NNI round %d: %d switches in %.3fs, %d nodes to revisit', i + 1, switches,
+                             seconds, len(dirty))
+            if not switches:
+                break
+
+        self.log_cache_statistics()
+        return statistics
+
+    def nearest_neighbor_interchange(self, dirty: set[Node] = None) -> tuple[int, set[Node]]:
+        """
+        Perform nearest neighbor interchange to evaluate if a split is favorable. Every node is visited once, deepest
+        first, or only the given dirty nodes
+        :param dirty: the nodes to revisit, all nodes when None
+        :return: the number of switches and the nodes near them, which are dirty for the next round
+        """
+        candidates = self.nodes if dirty is None else dirty
+        depths = self.depths(self.root)
+        # ties go by slot, the order of self.nodes, and not by the order of the dirty set
+        queue = sorted((node for node in candidates if depths[node] >= 3), key=lambda node: (-depths[node], node.index))
+
+        switches = 0
+        changed = set()
+        for current_node in queue:
+            # an earlier switch of this round can have moved the node up
             if current_node.parent and current_node.parent.parent and current_node.parent.parent.parent:
 
                 # determine the a, b, c and d node for evaluating a different topology
@@ -186,47 +322,107 @@ class Tree:
                 c = current_node.parent.get_sibling()
                 d = a.parent.parent.parent
 
-                logger.debug(f'topology being evaluated: \ta=:{a.name}\tb:{b.name}\t\tc:{c.name}\td:{d.name}')
+                self.logger.debug('topology being evaluated: \ta=:%s\tb:%s\t\tc:%s\td:%s', a, b, c, d)
+
+                d_ab, d_cd, d_ac, d_bd, d_bc, d_ad = self.log_distances.distances([a, c, a, b, b, a],
+                                                                                  [b, d, c, d, c, d])
 
                 # topology abcd
-                d_abcd = Distances.log_corrected_profile_distance(a.profile, b.profile) + \
-                         Distances.log_corrected_profile_distance(c.profile, d.profile)
+                d_abcd = d_ab + d_cd
 
                 # topology acbd
-                d_acbd = Distances.log_corrected_profile_distance(a.profile, c.profile) + \
-                         Distances.log_corrected_profile_distance(b.profile, d.profile)
+                d_acbd = d_ac + d_bd
 
                 # topology adbc
-                d_bcad = Distances.log_corrected_profile_distance(b.profile, c.profile) + \
-                         Distances.log_corrected_profile_distance(a.profile, d.profile)
+                d_bcad = d_bc + d_ad
 
-                logger.debug(f'topology distances - d_abcd:{d_abcd}\t d_acbd:{d_acbd}\t d_bcad:{d_bcad}')
+                self.logger.debug('topology distances - d_abcd:%s\t d_acbd:%s\t d_bcad:%s', d_abcd, d_acbd, d_bcad)
+
+                # the two parents whose children are exchanged
+                parents = [a.parent, a.parent.parent]
 
                 if d_bcad < min(d_abcd, d_acbd):
-                    logger.debug(f'switching nodes: {d.name} - {b.name}')
-                    self.switch_nodes(b, a)
+                    self.logger.debug('switching nodes: %s - %s', a, c)
+                    self.switch_nodes(a, c)
 
                 elif d_acbd < min(d_abcd, d_bcad):
-                    logger.debug(f'switching nodes: {c.name} - {b.name}')
+                    self.logger.debug('switching nodes: %s - %s', c, b)
                     self.switch_nodes(b, c)
 
-            if current_node.parent and current_node.parent not in queue:
-                queue.append(current_node.parent)
+                else:
+                    continue
+
+                switches += 1
+                changed.update(self.neighbourhood(parents, 3))
 
-        # recompute the profile for all internal nodes
-        queue = [node.parent for node in self.nodes if node.is_leaf]
+        return switches, changed
 
-        while queue:
-            current_node = queue.pop()
-            if current_node != self.root and current_node.parent not in queue:
-                queue.append(current_node.parent)
+    def log_cache_statistics(self) -> None:
+        self.logger.debug('log distance cache: %s entries, %s hits, %s misses (%.1f%% hit rate)',
+                          len(self.log_distances), self.log_distances.hits, self.log_distances.misses,
+                          100 * self.log_distances.hit_rate)
 
-    def bootstrap(self) -> None:
+    @staticmethod
+    def depth(node: Node) -> int:
+        """
+        Number of ancestors of a node
+        """
+        depth = 0
+        while node.parent:
+            node = node.parent
+            depth += 1
+        return depth
+
+    @staticmethod
+    def depths(root: Node) -> dict[Node, int]:
+        """
+        Number of ancestors of every node below root, in one top-down pass instead of a walk to the root per node
+        :param root: the root of the tree
+        :return: dict of node to depth
+        """
+        depths = {root: 0}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in node.children:
+                depths[child] = depths[node] + 1
+                stack.append(child)
+        return depths
+
+    @staticmethod
+    def neighbourhood(nodes: list[Node], radius: int) -> set[Node]:
+        """
+        The nodes at most radius edges away from the given nodes, up or down the tree. A switch changes the quartet
+        of every node within three edges of the two parents it rearranged
+        :param nodes: the given nodes
+        :param radius: the number of edges
+        :return: set of nodes, including the given ones
+        """
+        result = set(nodes)
+        frontier = list(nodes)
+        for _ in range(radius):
+            next_frontier = []
+            for node in frontier:
+                for neighbour in node.children + ([node.parent] if node.parent else []):
+                    if neighbour not in result:
+                        result.add(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return result
+
+    def bootstrap(self, workers: int = 1, seed: int = None, scheme: str = 'subsample') -> None:
         """
         Function calculates the support values for all internal splits.
+        :param workers: number of processes to shard the splits over
+        :param seed: seed of the resampling, the seed of the build context if not given, the supports only depend on it
+            and not on the number of workers
+        :param scheme: 'subsample' draws 20% of the columns per round, 'resample' draws L columns with replacement
         """
         # for each split evaluate if bootstrapping support ti
         valid_nodes = [n for n in self.nodes if n.parent and n.parent.parent]
+        splits = []
+        quartets = []
+        planned = set()
         for node in valid_nodes:
 
             a = node
@@ -236,40 +432,35 @@ class Tree:
             if a.parent.parent.parent:
                 d = a.parent.parent.parent
 
-            else:
+            elif c.children:
                 d = c.children[0]
 
-            if a.parent.support_value:
+            else:
+                # in a tree of three leaves there is no fourth node around the split
                 continue
 
-            result = 0
-            for i in range(self.bootstrap_rounds):
-                random_columns = sorted(random.sample(range(self.L), round(self.L * 0.2)))
-
-                bootstrap_profile_a = a.profile[:, random_columns]
-                bootstrap_profile_b = b.profile[:, random_columns]
-                bootstrap_profile_c = c.profile[:, random_columns]
-                bootstrap_profile_d = d.profile[:, random_columns]
+            if a.parent.support_value or a.parent in planned:
+                continue
 
-                # topology abcd
-                d_abcd = Distances.log_corrected_profile_distance(bootstrap_profile_a, bootstrap_profile_b) + \
-                         Distances.log_corrected_profile_distance(bootstrap_profile_c, bootstrap_profile_d)
+            planned.add(a.parent)
+            splits.append(a.parent)
+            quartets.append([a.index, b.index, c.index, d.index])
 
-                # topology acbd
-                d_acbd = Distances.log_corrected_profile_distance(bootstrap_profile_a, bootstrap_profile_c) + \
-                         Distances.log_corrected_profile_distance(bootstrap_profile_b, bootstrap_profile_d)
+        if not splits:
+            return
 
-                # topology adbc
-                d_bcad = Distances.log_corrected_profile_distance(bootstrap_profile_b, bootstrap_profile_c) + \
-                         Distances.log_corrected_profile_distance(bootstrap_profile_a, bootstrap_profile_d)
+        # the workers read the profile block directly, so the stale profiles are rebuilt first
+        self.root.refresh_profile()
 
-                # check if the bootstrap supports the split
-                if d_abcd < min(d_acbd, d_bcad):
-                    result += 1
+        seed_sequence = np.random.SeedSequence(seed) if seed is not None else self.context.seed
+        self.logger.debug('bootstrap seed: %d', seed_sequence.entropy)
+        support = bootstrap_support(self.store.profiles[:self.store.size], np.array(quartets), self.bootstrap_rounds,
+                                    seed_sequence, workers, scheme, self.store.patterns)
 
-            # the final bootstrap value for the split
-            logger.debug(f'bootstrap support: {result / self.bootstrap_rounds}')
-            a.parent.support_value = result / self.bootstrap_rounds
+        # the final bootstrap value for the split
+        for split, value in zip(splits, support):
+            self.logger.debug('bootstrap support: %s', value)
+            split.support_value = float(value)
 
     def switch_nodes(self, node_1: Node, node_2: Node) -> None:
         """
@@ -279,6 +470,11 @@ class Tree:
         """
         parent_1 = node_1.parent
         parent_2 = node_2.parent
+        self.switches += 1
+
+        # active parents are part of the total profile, which has to follow their new profiles
+        changed = [(parent, parent.profile.copy(), Distances.up_distance(parent))
+                   for parent in dict.fromkeys((parent_1, parent_2)) if parent in self.active_nodes]
 
         parent_1.children.remove(node_1)
         parent_2.children.remove(node_2)
@@ -289,141 +485,230 @@ class Tree:
         parent_1.children.append(node_2)
         node_2.parent = parent_1
 
-        parent_2.recompute_profile()
-        parent_1.recompute_profile()
+        # the profiles of both parents and of everything above them are rebuilt when they are read next
+        parent_2.mark_stale()
+        parent_1.mark_stale()
 
-        # rename the parent nodes
-        parent_1.name = parent_1.rename()
-        parent_2.name = parent_2.rename()
+        for parent, old_profile, old_up_distance in changed:
+            self.tp.on_switch(parent, old_profile, old_up_distance)
 
-        logger.debug(f'new topology:\t{self.to_newick()}')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('new topology:\t%s', self.to_newick())
 
     def set_top_hits(self) -> None:
         """
-        Sets a list of top hits for all the active nodes.
-        """
-        for current_node in self.nodes:
-            if not current_node.top_hits:
-
-                node_distances = {}
-
-                for node in self.nodes:
-                    if node != current_node:
-                        node_distances[node] = Distances.neighbor_join_distance(current_node, node, self.active_nodes,
-                                                                                self.tp)
-
-                        # check for best known
-                        if node_distances[node] < node.best_known.distance:
-                            node.best_known.distance = node_distances[node]
-                            node.best_known.node = current_node
-
-                        # check for best known
-                        if node_distances[node] < current_node.best_known.distance:
-                            current_node.best_known.distance = node_distances[node]
-                            current_node.best_known.node = node
-
-                # take 2m most similar
-                node_distances = {k: v for i, (k, v) in
-                                  enumerate(sorted(node_distances.items(), key=lambda x: x[1])) if i < 2 * self.m}
-
-                current_node.top_hits = {k: v for i, (k, v) in
-                                         enumerate(sorted(node_distances.items(), key=lambda x: x[1]))
-                                         if i < self.m}
-
-                # compute for other nodes
-                for n in current_node.top_hits:
-                    current_node = n
-                    if not current_node.top_hits:
-                        other_distances = {}
-
-                        for node in node_distances:
-                            if node != current_node:
-                                other_distances[node] = Distances.neighbor_join_distance(current_node, node,
-                                                                                         self.active_nodes, self.tp)
-                                # check for best known
-                                if node_distances[node] < node.best_known.distance:
-                                    node.best_known.distance = node_distances[node]
-                                    node.best_known.node = current_node
-
-                                # check for best known
-                                if node_distances[node] < current_node.best_known.distance:
-                                    current_node.best_known.distance = node_distances[node]
-                                    current_node.best_known.node = node
-
-                        # set m most similar
-                        current_node.top_hits = {k: v for i, (k, v) in
-                                                 enumerate(sorted(other_distances.items(), key=lambda x: x[1]))
-                                                 if i < self.m}
-
-    def set_top_hits_node(self, new_node: Node, children_top_hits: list[Node], children: list[Node]) -> None:
-        """
-        Sets top hits list for a specific node, that has been created during joining
-        :param children: combined children of the joined nodes
-        :param new_node: the newly joined node
-        :param children_top_hits: list of top hits
+        Sets the top hits of all the leaves with the seed heuristic of the FastTree paper. Every node that has no top
+        hits yet becomes a seed and is compared to all other nodes in one batch, its m closest nodes are its top hits.
+        Every one of its 2m closest nodes (the candidates) that is close to the seed and has no top hits yet only
+        compares itself with the seed and the other candidates, and takes its m closest of those. As O(m) nodes are
+        covered per seed, only O(N / m) nodes are compared to all others, O(N * sqrt(N)) distances for m = sqrt(N).
         """
-        if all(elem not in self.active_nodes for elem in children_top_hits):
-            children_top_hits = self.active_nodes
+        for seed in self.nodes:
+            if seed.top_hits:
+                continue
 
-        node_distances: dict[Node, float] = {}
-        for node in children_top_hits:
-            if node != new_node:
-                node_distances[node] = Distances.neighbor_join_distance(new_node, node, self.active_nodes, self.tp)
+            others = [node for node in self.nodes if node != seed]
+            distances = self.neighbor_join_distances(seed, others)
+            self.update_best_known(seed, others, distances)
+            self.seeds += 1
 
-                # check for best known
-                if node_distances[node] < node.best_known.distance:
-                    node.best_known.distance = node_distances[node]
-                    node.best_known.node = new_node
+            # take 2m most similar, of which the m most similar are the top hits
+            closest = self.closest(distances, 2 * self.m)
+            candidates = [others[i] for i in closest]
+            candidate_distances = distances[closest]
+            self.set_top_hits_of(seed, dict(zip(candidates[:self.m], candidate_distances[:self.m].tolist())))
 
-                # check for best known
-                if node_distances[node] < new_node.best_known.distance and node not in children:
-                    new_node.best_known.distance = node_distances[node]
-                    new_node.best_known.node = node
+            # the neighbor-joining distances have no fixed scale and can be negative, so closeness is judged on the
+            # rank among the candidates
+            for position in range(min(len(candidates), round(self.close_ratio * 2 * self.m))):
+                neighbor = candidates[position]
+                if neighbor.top_hits:
+                    continue
 
-        new_node.top_hits = {k: v for i, (k, v) in
-                             enumerate(sorted(node_distances.items(), key=lambda x: x[1]))
-                             if i < self.m}
+                # the seed itself is the first candidate of its neighbors
+                neighbors = [seed] + candidates[:position] + candidates[position + 1:]
+                neighbor_distances = self.neighbor_join_distances(neighbor, neighbors)
 
-    def calculate_branch_length(self):
+                self.update_best_known(neighbor, neighbors, neighbor_distances)
+                closest = self.closest(neighbor_distances, self.m)
+                self.set_top_hits_of(neighbor, dict(zip([neighbors[i] for i in closest],
+                                                        neighbor_distances[closest].tolist())))
+
+        self.logger.debug('top hits: %s of %s nodes compared to all others', self.seeds, len(self.nodes))
+
+    def neighbor_join_distances(self, node: Node, nodes: list[Node]) -> np.array:
         """
-        Calculates the branch length for all nodes
+        Neighbor-joining distances between one node and many nodes in one batch, with cached out-distances
+        :param node: the node
+        :param nodes: the nodes to compare with
+        :return: array of distances, in the order of nodes
         """
-        r = self.root
+        return Distances.neighbor_join_distances(node, nodes, self.active_nodes, self.tp, self.out_distances)
 
-        for node in self.nodes:
+    def set_best_known(self, node: Node, other: Node, distance: float) -> None:
+        """
+        Sets the best known join of a node and requeues the node while the initial topology is built
+        :param node: the node
+        :param other: the node to join it with
+        :param distance: the neighbor-joining distance between the two
+        """
+        if node.best_known.node is not other:
+            self.best_known_holders.setdefault(other, []).append(node)
+        node.best_known.node = other
+        node.best_known.distance = distance
+        if self.join_queue is not None:
+            self.join_queue.push(node)
+
+    def update_best_known(self, node: Node, others: list[Node], distances: np.array) -> None:
+        """
+        Makes node the best known join of every other node it is closer to than their current best known join, and
+        the closest other node the best known join of node if it is closer than its current one
+        :param node: the node
+        :param others: the other nodes
+        :param distances: distances between node and the other nodes
+        """
+        if not others:
+            return
 
-            if node == self.root:
-                node.branch_length = 0
+        known = np.fromiter((other.best_known.distance for other in others), dtype=float, count=len(others))
+        for i in np.flatnonzero(distances < known).tolist():
+            self.set_best_known(others[i], node, float(distances[i]))
 
-            # if current node is leaf node A
-            elif node.is_leaf:
+        best = int(np.argmin(distances))
+        if distances[best] < node.best_known.distance:
+            self.set_best_known(node, others[best], float(distances[best]))
 
-                a = node
-                b = node.get_sibling()
-                node.branch_length = (Distances.log_corrected_profile_distance(a.profile, r.profile) +
-                                      Distances.log_corrected_profile_distance(a.profile, b.profile) -
-                                      Distances.log_corrected_profile_distance(b.profile, r.profile)) / 2
+    @staticmethod
+    def closest(distances: np.array, k: int) -> np.array:
+        """
+        Positions of the k smallest distances in ascending order, ties are kept in their original order
+        :param distances: array of distances
+        :param k: number of positions to select
+        :return: integer array of at most k positions
+        """
+        if k >= len(distances):
+            return np.argsort(distances, kind='stable')
 
-                if node.branch_length < 0:
-                    b.branch_length -= node.branch_length
-                    node.branch_length = 0
+        threshold = distances[np.argpartition(distances, k - 1)[:k]].max()
+        below = np.flatnonzero(distances < threshold)
+        tied = np.flatnonzero(distances == threshold)[:k - len(below)]
+        selected = np.concatenate([below, tied])
+        return selected[np.argsort(distances[selected], kind='stable')]
 
-            # if current node is internal node
-            else:
-                # current node is AB, consisting of nodes A and B (calculate d(AB,r))
-                ab = node
-                a = node.children[0]
-                b = node.children[1]
-                c = node.get_sibling()
-                node.branch_length = (Distances.log_corrected_profile_distance(a.profile, r.profile) +
-                                      Distances.log_corrected_profile_distance(a.profile, c.profile) +
-                                      Distances.log_corrected_profile_distance(b.profile, r.profile) +
-                                      Distances.log_corrected_profile_distance(b.profile, c.profile)) / 4 - \
-                                     (Distances.log_corrected_profile_distance(a.profile, b.profile) +
-                                      Distances.log_corrected_profile_distance(r.profile, c.profile)) / 2
-
-                if node.branch_length < 0:
-                    c.branch_length -= node.branch_length
-                    node.branch_length = 0
-
-            logger.debug(f'node:{node.name}\tbranch length:{node.branch_length}')
+    def set_top_hits_node(self, new_node: Node, children_top_hits: list[Node], children: list[Node]) -> None:
+        """
+        Sets top hits list for a specific node, that has been created during joining. The node is compared to the
+        active top hits of its children, or to all active nodes when fewer than refresh_ratio * m of those are left.
+        After such a refresh the node is also offered to the top hits of its new top hits
+        :param children: combined children of the joined nodes
+        :param new_node: the newly joined node
+        :param children_top_hits: list of top hits
+        """
+        candidates = [node for node in children_top_hits if node in self.active_nodes and node != new_node]
+        refresh = not candidates or len(candidates) < self.refresh_ratio * min(self.m, len(self.active_nodes) - 1)
+        if refresh:
+            candidates = [node for node in self.active_nodes if node != new_node]
+            self.refreshes += 1
+
+        distances = self.neighbor_join_distances(new_node, candidates).tolist()
+        for node, distance in zip(candidates, distances):
+            # check for best known
+            if distance < node.best_known.distance:
+                self.set_best_known(node, new_node, distance)
+
+            # check for best known
+            if distance < new_node.best_known.distance and node not in children:
+                self.set_best_known(new_node, node, distance)
+
+        self.set_top_hits_of(new_node, {k: v for i, (k, v) in
+                                        enumerate(sorted(zip(candidates, distances), key=lambda x: x[1]))
+                                        if i < self.m})
+
+        if refresh:
+            for node, distance in new_node.top_hits.items():
+                self.offer_top_hit(node, new_node, distance)
+
+    def offer_top_hit(self, node: Node, other: Node, distance: float) -> None:
+        """
+        Adds other to the top hits of node if the list is not full or other is closer than its farthest top hit
+        :param node: the node whose top hits are updated
+        :param other: the new candidate
+        :param distance: the distance between the two
+        """
+        if len(node.top_hits) >= self.m:
+            farthest = max(node.top_hits, key=node.top_hits.get)
+            if distance >= node.top_hits[farthest]:
+                return
+            del node.top_hits[farthest]
+
+        node.top_hits[other] = distance
+        self.top_hit_holders.setdefault(other, []).append(node)
+
+    def calculate_branch_length(self):
+        """
+        Calculates the branch length for all nodes. The log corrected distances of every node are gathered into index
+        arrays over the profile store and computed in one batch:
+        leaf a with sibling b: (d(a,r) + d(a,b) - d(b,r)) / 2
+        internal node with children a, b and sibling c: (d(a,r) + d(a,c) + d(b,r) + d(b,c)) / 4 - (d(a,b) + d(r,c)) / 2
+        A negative length is set to zero and added to the sibling (leaves) or to c (internal nodes). The nodes used to
+        be handled one after another in the order of self.nodes, so an addition only lasts if the sibling came first
+        and was not overwritten afterwards, the vectorized pass keeps exactly that rule
+        """
+        r = self.root
+        r.refresh_profile()
+
+        nodes = [node for node in self.nodes if node != r]
+        leaves = [node for node in nodes if node.is_leaf]
+        internal = [node for node in nodes if not node.is_leaf]
+
+        # rows of the pairs, three per leaf and six per internal node
+        leaf_rows = np.array([(a.index, a.get_sibling().index) for a in leaves], dtype=np.intp).reshape(-1, 2)
+        internal_rows = np.array([(node.children[0].index, node.children[1].index, node.get_sibling().index)
+                                  for node in internal], dtype=np.intp).reshape(-1, 3)
+        a, b = leaf_rows.T
+        x, y, c = internal_rows.T
+        root = np.full(len(leaves), r.index)
+        internal_root = np.full(len(internal), r.index)
+        first = np.concatenate([a, a, b, x, x, y, y, x, internal_root])
+        second = np.concatenate([root, b, root, internal_root, c, internal_root, c, y, c])
+
+        distances = self.pair_log_distances(first, second)
+        d_ar, d_ab, d_br = distances[:3 * len(leaves)].reshape(3, -1)
+        d_xr, d_xc, d_yr, d_yc, d_xy, d_rc = distances[3 * len(leaves):].reshape(6, -1)
+
+        raw = np.concatenate([(d_ar + d_ab - d_br) / 2, (d_xr + d_xc + d_yr + d_yc) / 4 - (d_xy + d_rc) / 2])
+
+        # redistribution of the negative lengths, an addition to a target lasts if the target was handled earlier
+        positions = {node: i for i, node in enumerate(self.nodes)}
+        position = np.array([positions[node] for node in leaves + internal], dtype=np.intp)
+        target = np.array([positions[node.get_sibling()] for node in leaves + internal], dtype=np.intp)
+
+        lengths = np.zeros(len(self.nodes))
+        lengths[position] = np.maximum(raw, 0)
+        moved = (raw < 0) & (target < position)
+        np.add.at(lengths, target[moved], -raw[moved])
+
+        # the root and the clipped lengths that got nothing added were set to the integer 0, and are written as 0
+        zero = np.ones(len(self.nodes), dtype=bool)
+        zero[position] = raw < 0
+        zero[target[moved]] = False
+
+        for node, length, is_zero in zip(self.nodes, lengths.tolist(), zero.tolist()):
+            node.branch_length = 0 if is_zero else length
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for node in self.nodes:
+                self.logger.debug('node:%s\tbranch length:%s', node, node.branch_length)
+
+    def pair_log_distances(self, rows_1: np.array, rows_2: np.array) -> np.array:
+        """
+        Log corrected distances between pairs of rows of the profile store, every distinct pair is computed once
+        :param rows_1: the first row of every pair
+        :param rows_2: the second row of every pair
+        :return: array of distances, in the order of the pairs
+        """
+        keys = np.minimum(rows_1, rows_2) * self.store.capacity + np.maximum(rows_1, rows_2)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        distances = Distances.indexed_pair_distances(self.store.profiles, keys // self.store.capacity,
+                                                     keys % self.store.capacity)
+        return Distances.log_corrected_distances(distances)[inverse]
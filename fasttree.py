@@ -1,91 +1,109 @@
 #!/usr/bin/env python3
-from classes import *
-import math
+import sys
 import argparse
 import logging
-from Bio import Phylo
-
-# argument parser for cli
-parser = argparse.ArgumentParser(description='Re-creation of FastTree Algorithm in Python, original authors: Morgan N. '
-                                             'Price, Paramvir S. Dehal, and Adam P. Arkin, FastTree: Computing Large '
-                                             'Minimum Evolution Trees with Profiles instead of a Distance Matrix, '
-                                             'DOI: 10.1093/molbev/msp077')
-
-parser.add_argument('input_file', metavar='input_file', type=str,
-                    help='document containing nucleotide sequence in .aln format')
-parser.add_argument('output_file', metavar='output_file', type=str,
-                    help='output file in newick format')
-parser.add_argument('-v', help='print verbose debugging information', action='store_true')
-parser.add_argument('-t', help='view result in tree format', action='store_true')
-
-parser.add_argument('-b',metavar='bootstrap_rounds', help='Bootstrap rounds to evaluate the split of each internal node',
-                    type=int, default=0)
-
-args = parser.parse_args()
-
-
-# logging settings
-logging.basicConfig(format='%(asctime)s %(message)s', datefmt='[%I:%M:%S %p]')
-logger = logging.getLogger('FastTree')
-
-if args.v:
-    logging.basicConfig(level=logging.DEBUG)
-    logger.setLevel(logging.DEBUG)
-
-# parse the alignment file
-parser = AlignmentParser(args.input_file)
-
-# initialize Nodes and Tree
-nodes = parser.get_data()
-N = len(nodes)
-m = round(math.sqrt(N))
-L = len(nodes[0].alignment)
-bootstrapping_round = args.b
-tree = Tree(nodes, m, N, L, args.b, bootstrapping_round)
-
-a = 4
-nni_round = math.log(N) / math.log(2) + 1
-
-for node in nodes:
-    logger.debug(f'{node.name=}\t{node.alignment}\t {node.profile=}')
-
-# calculate total profile
-tp = TotalProfile(nodes)
-tree.set_total_profile(tp)
-
-logging.debug('total profile:')
-logging.debug(f'{tp.total_profile=}')
-
-# set top hist list for every node
-tree.set_top_hits()
-for node in nodes:
-    logging.debug(f'{node.name=} top hits: {[_.name for _ in node.top_hits]}\t {round(node.best_known.distance)=} '
-                  f'{node.best_known.node.name=}')
-
-# set the best join
-tree.construct_initial_topology()
-
-# NNI
-for i in range(round(nni_round)):
-    if tree.joins > 200:
-        tp.recompute(tree.active_nodes)
-        tree.set_total_profile(tp)
-
-    tree.nearest_neighbor_interchange()
-
-# local bootstrap
-if bootstrapping_round:
-    tree.bootstrap()
-
-# branch length
-tree.calculate_branch_length()
-
-# print the tree
-logger.debug(f'Final topology: {tree.to_newick()}')
-tree.save(args.output_file)
-print(tree.to_newick())
-
-# show the tree if flag provided
-if args.t:
-    phylo_tree = Phylo.read(args.output_file, 'newick')
-    Phylo.draw(phylo_tree)
+from classes import AlignmentCache, BuildOptions, build_tree, profiler
+
+
+def argument_parser() -> argparse.ArgumentParser:
+    """
+    :return: the parser of the command line
+    """
+    parser = argparse.ArgumentParser(description='Re-creation of FastTree Algorithm in Python, original authors: '
+                                                 'Morgan N. Price, Paramvir S. Dehal, and Adam P. Arkin, FastTree: '
+                                                 'Computing Large Minimum Evolution Trees with Profiles instead of a '
+                                                 'Distance Matrix, DOI: 10.1093/molbev/msp077')
+
+    parser.add_argument('input_file', metavar='input_file', type=str,
+                        help='document containing nucleotide sequence in .aln format')
+    parser.add_argument('output_file', metavar='output_file', type=str,
+                        help='output file in newick format')
+    parser.add_argument('-v', help='print verbose debugging information', action='store_true')
+    parser.add_argument('-t', help='view result in tree format', action='store_true')
+
+    add_build_arguments(parser)
+    parser.add_argument('-w', metavar='workers', help='number of processes for the bootstrap', type=int, default=1)
+    parser.add_argument('-c', metavar='cache_file', nargs='?', const='', default=None,
+                        help='build or use a binary cache of the parsed alignment, next to the input file unless a '
+                             'path is given')
+    parser.add_argument('--profile', metavar='json_file', nargs='?', const='', default=None,
+                        help='time every phase and count the distance calls, printed as a table to stderr at exit or '
+                             'written to a JSON file if a path is given')
+
+    return parser
+
+
+def add_build_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of the tree building, shared with fasttree_batch.py
+    :param parser: the parser of the command line
+    """
+    parser.add_argument('-b',metavar='bootstrap_rounds',
+                        help='Bootstrap rounds to evaluate the split of each internal node', type=int, default=0)
+    parser.add_argument('-r', help='bootstrap by resampling all columns with replacement instead of drawing 20%% of '
+                                   'them', action='store_true')
+    parser.add_argument('--seed', help='seed of the bootstrap resampling, results do not depend on the number of '
+                                       'workers', type=int, default=None)
+    parser.add_argument('-s', help='store profiles in single precision to halve their memory use',
+                        action='store_true')
+    parser.add_argument('-g', help='compact alignment: store repeated columns once and drop all-gap and constant '
+                                   'columns', action='store_true')
+    parser.add_argument('-m', metavar='top_hits', help='length of the top-hits lists, the square root of the number '
+                                                    'of sequences by default', type=int, default=None)
+    parser.add_argument('--close', help='fraction of the 2m closest nodes of a seed that take their top hits from the '
+                                        'seed\'s 2m closest nodes', type=float, default=0.75)
+    parser.add_argument('--refresh', help='compare a joined node to all active nodes when fewer than this fraction of '
+                                          'm of its children\'s top hits are still active', type=float, default=0.8)
+
+
+def build_options(args: argparse.Namespace, **options) -> BuildOptions:
+    """
+    :param args: the parsed command line, with the arguments of add_build_arguments
+    :param options: further settings of BuildOptions
+    :return: the build options of the command line
+    """
+    return BuildOptions(single=args.s, compact=args.g, m=args.m, close_ratio=args.close, refresh_ratio=args.refresh,
+                        bootstrap_rounds=args.b, resample=args.r, seed=args.seed, **options)
+
+
+def main(argv: list[str] = None) -> None:
+    args = argument_parser().parse_args(argv)
+
+    # logging settings
+    logging.basicConfig(format='%(asctime)s %(message)s', datefmt='[%I:%M:%S %p]')
+    logger = logging.getLogger('FastTree')
+
+    if args.v:
+        logging.basicConfig(level=logging.DEBUG)
+        logger.setLevel(logging.DEBUG)
+
+    if args.profile is not None:
+        profiler.enable()
+
+    options = build_options(args, workers=args.w,
+                            cache=None if args.c is None else args.c or AlignmentCache.default_path(args.input_file))
+    tree = build_tree(args.input_file, options)
+
+    # print the tree
+    with profiler.phase('output'):
+        tree.save(args.output_file)
+        tree.write_newick(sys.stdout)
+        print()
+
+    if args.profile is not None:
+        profiler.count(joins=tree.joins, seeds=tree.seeds, top_hit_refreshes=tree.refreshes,
+                       nni_switches=tree.switches, total_profile_recomputes=tree.tp.recomputes)
+        if args.profile:
+            profiler.write_json(args.profile)
+        else:
+            profiler.report(sys.stderr)
+
+    # show the tree if flag provided, Biopython and matplotlib are only imported for it
+    if args.t:
+        from Bio import Phylo
+        phylo_tree = Phylo.read(args.output_file, 'newick')
+        Phylo.draw(phylo_tree)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import time
+from classes import batch_inputs, build_batch, output_names
+from fasttree import add_build_arguments, build_options
+
+
+def argument_parser() -> argparse.ArgumentParser:
+    """
+    :return: the parser of the command line
+    """
+    parser = argparse.ArgumentParser(description='Builds the trees of many alignments in one run, in a pool of worker '
+                                                 'processes that are started once for the whole batch. The trees are '
+                                                 'written as soon as they are built, and the time of every alignment '
+                                                 'is reported on stderr.')
+
+    parser.add_argument('inputs', metavar='inputs', type=str,
+                        help='directory of .aln files, or a manifest file listing one alignment per line')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('-o', metavar='output_file', help='write all trees to one file, one line per alignment with '
+                                                           'its path and its tree separated by a tab (stdout by '
+                                                           'default)')
+    output.add_argument('-d', metavar='output_directory', help='write the tree of every alignment to its own file '
+                                                               'in this directory, at the path of the alignment '
+                                                               'relative to the inputs with the extension .out')
+    parser.add_argument('-j', metavar='workers', help='number of worker processes, the number of CPUs by default',
+                        type=int, default=os.cpu_count())
+    parser.add_argument('--timings', metavar='timings_file', help='also write the time of every alignment to this '
+                                                                  'tab separated file')
+    add_build_arguments(parser)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argument_parser()
+    args = parser.parse_args(argv)
+    paths = batch_inputs(args.inputs)
+    if args.d:
+        # alignments that would overwrite each other's trees are refused before anything is built
+        try:
+            outputs = dict(zip(paths, output_names(paths, args.inputs)))
+        except ValueError as e:
+            parser.error(str(e))
+        os.makedirs(args.d, exist_ok=True)
+
+    output = open(args.o, 'w') if args.o else sys.stdout
+    timings = open(args.timings, 'w') if args.timings else None
+    if timings:
+        timings.write('path\tleaves\tseconds\terror\n')
+
+    start = time.perf_counter()
+    failed = 0
+    try:
+        for result in build_batch(paths, build_options(args), args.j):
+            if result.error is None:
+                if args.d:
+                    path = os.path.join(args.d, outputs[result.path])
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'w') as file:
+                        file.write(result.newick)
+                else:
+                    output.write(f'{result.path}\t{result.newick}\n')
+                    output.flush()
+                print(f'{result.path}\t{result.leaves} leaves\t{result.seconds:.3f}s', file=sys.stderr)
+            else:
+                failed += 1
+                print(f'{result.path}\tfailed: {result.error}', file=sys.stderr)
+
+            if timings:
+                timings.write(f'{result.path}\t{result.leaves}\t{result.seconds:.6f}\t{result.error or ""}\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if timings:
+            timings.close()
+
+    print(f'{len(paths) - failed} of {len(paths)} alignments built in {time.perf_counter() - start:.3f}s with '
+          f'{args.j} workers', file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
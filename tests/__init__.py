@@ -1,3 +1,2 @@
 from .aln_parser_test import *
 from .distance_test import *
-from .main_tester import *
\ No newline at end of file
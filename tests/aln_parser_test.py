@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
-from classes import aln_parser
+import numpy as np
+from classes import aln_parser, Distances
 
 
 class TestAlignmentParser(unittest.TestCase):
@@ -24,6 +27,65 @@ class TestAlignmentParser(unittest.TestCase):
             self.assertEqual(node.alignment, aln)
             self.assertEqual(node.name, str(i))
 
+    def parse(self, text, **kwargs):
+        with tempfile.NamedTemporaryFile('w', suffix='.aln', delete=False) as file:
+            file.write(text)
+        try:
+            return aln_parser.AlignmentParser(file.name, **kwargs)
+        finally:
+            os.remove(file.name)
+
+    def test_wrapped_records(self):
+        parser = self.parse(">a\nACG\nT-A\n\n>b\nAAN\nTTu\n")
+        data = parser.get_data()
+
+        self.assertEqual((parser.N, parser.L), (2, 6))
+        self.assertEqual([node.name for node in data], ['a', 'b'])
+        self.assertEqual(data[0].alignment, "ACGT-A")
+        # undetermined bases are treated as gaps
+        self.assertEqual(data[1].alignment, "AA-TTT")
+        np.testing.assert_array_equal(data[1].profile[:, 2], np.zeros(4))
+        self.assertEqual(parser.store.capacity, 3)
+
+    def test_keep_alignment(self):
+        data = self.parse(">a\nACGN\n>b\nA-GT\n", keep_alignment=True).get_data()
+        self.assertEqual(data[0].alignment, "ACGN")
+
+        parsed = aln_parser.AlignmentParser("./resources/test-small.aln").get_data()
+        for node in parsed:
+            np.testing.assert_array_equal(node.profile, node.form_profile())
+
+    def test_compact(self):
+        full = aln_parser.AlignmentParser("./resources/fasttree-input.aln")
+        compact = aln_parser.AlignmentParser("./resources/fasttree-input.aln", compact=True)
+        patterns = compact.store.patterns
+
+        self.assertLess(compact.store.L, full.L)
+        self.assertEqual(patterns.L, full.L)
+        self.assertEqual(patterns.counts.sum(), full.L)
+
+        # every distance over the kept patterns equals the distance over all columns
+        full_nodes, compact_nodes = full.get_data(), compact.get_data()
+        for i in range(0, len(full_nodes), 5):
+            expected = Distances.profile_distances(full_nodes[i].profile, full.store.profiles[:full.N])
+            actual = Distances.profile_distances(compact_nodes[i].profile, compact.store.profiles[:compact.N])
+            np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-15)
+            self.assertEqual(compact_nodes[i].alignment, full_nodes[i].alignment)
+
+    def test_compact_columns(self):
+        data = self.parse(">a\nA-CGTA\n>b\nA-CGAA\n>c\nA-TGTA\n", compact=True).get_data()
+        patterns = data[0].store.patterns
+
+        # the constant and the all-gap columns are dropped, the two informative columns are kept
+        self.assertEqual(patterns.width, 2)
+        self.assertEqual(list(patterns.column_index >= 0), [False, False, True, False, True, False])
+        self.assertEqual([node.alignment for node in data], ["A-CGTA", "A-CGAA", "A-TGTA"])
+
+    def test_invalid_input(self):
+        for text in [">a\nACGZ\n", ">a\nACGT\n>b\nACG\n", "ACGT\n", ""]:
+            with self.assertRaises(Exception):
+                self.parse(text)
+
 
 if __name__ == '__main__':
     unittest.main()
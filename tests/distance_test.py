@@ -0,0 +1,118 @@
+import unittest
+import numpy as np
+from classes import *
+
+
+def loop_profile_distance(profile_1: np.array, profile_2: np.array) -> float:
+    """
+    The original per-cell profile distance, kept as the reference for the vectorized kernel
+    """
+    S = 0
+    for i in range(4):
+        for j in range(len(profile_1[0])):
+            S += abs(profile_1[i, j] - profile_2[i, j])
+
+    return S / (4 * len(profile_1[0]))
+
+
+class TestDistances(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.nodes = AlignmentParser("./resources/test-small.aln").get_data()
+
+        # profiles as they appear during the join loop: leaves and averages of leaves
+        self.profiles = [node.profile for node in self.nodes]
+        for i in range(0, len(self.nodes) - 1, 2):
+            self.profiles.append(Node.join_profiles(self.profiles[i], self.profiles[i + 1]))
+        self.profiles.append(Node.join_profiles(self.profiles[-1], self.profiles[-2]))
+
+    def test_profile_distance_parity(self):
+        for profile_1 in self.profiles:
+            for profile_2 in self.profiles:
+                self.assertEqual(Distances.profile_distance(profile_1, profile_2),
+                                 loop_profile_distance(profile_1, profile_2))
+
+    def test_profile_distance_parity_random(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            profile_1, profile_2 = rng.random((2, 4, 57))
+            self.assertAlmostEqual(Distances.profile_distance(profile_1, profile_2),
+                                   loop_profile_distance(profile_1, profile_2), places=12)
+
+    def test_profile_distances_one_vs_many(self):
+        stack = np.array(self.profiles)
+        result = Distances.profile_distances(self.profiles[3], stack)
+
+        self.assertEqual(result.shape, (len(self.profiles),))
+        for profile, distance in zip(self.profiles, result):
+            self.assertEqual(distance, loop_profile_distance(self.profiles[3], profile))
+
+    def test_profile_distances_pairwise(self):
+        stack = np.array(self.profiles)
+        result = Distances.profile_distances(stack, stack[::-1])
+
+        for profile_1, profile_2, distance in zip(self.profiles, self.profiles[::-1], result):
+            self.assertEqual(distance, loop_profile_distance(profile_1, profile_2))
+
+    def test_profile_distance_matrix(self):
+        stack = np.array(self.profiles)
+        result = Distances.profile_distance_matrix(stack[:5], stack)
+
+        self.assertEqual(result.shape, (5, len(self.profiles)))
+        for i in range(5):
+            for j in range(len(self.profiles)):
+                self.assertEqual(result[i, j], loop_profile_distance(self.profiles[i], self.profiles[j]))
+
+    def test_neighbor_join_distances_parity(self):
+        tree = Tree(self.nodes, 3, len(self.nodes))
+        A, B, C, D = self.nodes[:4]
+        tree.join_nodes(A, B)
+        CD = tree.join_nodes(C, D)
+        active = list(tree.active_nodes)
+
+        for node in (CD, self.nodes[5]):
+            others = [other for other in active if other != node]
+            result = Distances.neighbor_join_distances(node, others, tree.active_nodes, tree.tp)
+            for other, distance in zip(others, result):
+                self.assertEqual(distance, Distances.neighbor_join_distance(node, other, tree.active_nodes, tree.tp))
+
+    def test_log_corrected_profile_distances(self):
+        stack = np.array(self.profiles)
+        result = Distances.log_corrected_profile_distances(stack[0], stack)
+
+        for profile, distance in zip(self.profiles, result):
+            self.assertAlmostEqual(distance, Distances.log_corrected_profile_distance(stack[0], profile), places=12)
+
+        # saturated distances are capped
+        self.assertEqual(Distances.log_corrected_profile_distances(np.ones((4, 4)), np.zeros((4, 4))), 1.5)
+
+    def test_packed_distances_parity(self):
+        rng = np.random.default_rng(3)
+        for L in (1, 63, 64, 65, 300):
+            codes = rng.integers(0, 5, (6, L)).astype(np.uint8)
+            packed = PackedSequences(6, L)
+            for row, sequence_codes in enumerate(codes):
+                packed.set(row, sequence_codes)
+
+            profiles = [profile_from_codes(sequence_codes) for sequence_codes in codes]
+            result = packed.distances(0, np.arange(6))
+            for row, profile in enumerate(profiles):
+                self.assertEqual(result[row], Distances.profile_distance(profiles[0], profile))
+                self.assertEqual(packed.distance(row, 0), result[row])
+
+    def test_packed_leaf_distances(self):
+        # leaves take the packed path, joined nodes the profile path, both must agree with the profiles
+        tree = Tree(self.nodes, 3, len(self.nodes))
+        AB = tree.join_nodes(self.nodes[0], self.nodes[1])
+        others = self.nodes[2:] + [AB]
+        self.assertIsNotNone(self.nodes[2].store.packed)
+
+        result = Distances.node_distances(self.nodes[2], others)
+        for other, distance in zip(others, result):
+            expected = Distances.profile_distance(self.nodes[2].profile, other.profile) - Distances.up_distance(other)
+            self.assertAlmostEqual(distance, expected, places=15)
+            self.assertAlmostEqual(Distances.node_distance(self.nodes[2], other), expected, places=15)
+
+
+if __name__ == '__main__':
+    unittest.main()
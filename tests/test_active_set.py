@@ -0,0 +1,38 @@
+from unittest import TestCase
+from classes import *
+
+
+class TestActiveSet(TestCase):
+
+    def setUp(self) -> None:
+        self.store = ProfileStore(6, 4)
+        self.nodes = [Node(name, "ACGT", store=self.store) for name in "ABCDE"]
+
+    def test_membership(self) -> None:
+        active = ActiveSet(self.nodes[:3], self.store.capacity)
+        A, B, C, D, E = self.nodes
+
+        self.assertEqual(len(active), 3)
+        self.assertTrue(A in active)
+        self.assertFalse(D in active)
+        self.assertFalse(None in active)
+
+        active.remove(B)
+        self.assertFalse(B in active)
+        self.assertEqual(len(active), 2)
+        self.assertRaises(KeyError, active.remove, B)
+
+    def test_iteration_keeps_order(self) -> None:
+        active = ActiveSet(self.nodes, self.store.capacity)
+        A, B, C, D, E = self.nodes
+
+        active.remove(B)
+        active.remove(D)
+        self.assertEqual(list(active), [A, C, E])
+
+        active.add(B)
+        active.add(B)
+        self.assertEqual(list(active), [A, C, E, B])
+        self.assertEqual(list(active.indices()), [A.index, C.index, E.index, B.index])
+        self.assertEqual(active.pop(), B)
+        self.assertEqual(len(active), 3)
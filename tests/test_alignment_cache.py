@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from classes import AlignmentCache, AlignmentParser
+
+
+class TestAlignmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'input.aln')
+        self.cache = AlignmentCache.default_path(self.input)
+        shutil.copy('./resources/test-small.aln', self.input)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_warm_load(self):
+        cold = AlignmentParser(self.input, cache=self.cache)
+        self.assertTrue(os.path.exists(self.cache))
+
+        warm = AlignmentParser(self.input, cache=self.cache, keep_alignment=True)
+        self.assertIsNotNone(AlignmentCache(self.cache).read(self.input))
+        self.assertEqual((warm.N, warm.L), (cold.N, cold.L))
+        self.assertEqual([node.name for node in warm.get_data()], [node.name for node in cold.get_data()])
+        self.assertEqual([node.alignment for node in warm.get_data()], [node.alignment for node in cold.get_data()])
+        np.testing.assert_array_equal(warm.store.profiles, cold.store.profiles)
+        self.assertEqual(warm.store.size, cold.store.size)
+
+    def test_compact_from_cache(self):
+        AlignmentParser(self.input, cache=self.cache)
+        cold = AlignmentParser(self.input, compact=True)
+        warm = AlignmentParser(self.input, cache=self.cache, compact=True)
+
+        np.testing.assert_array_equal(warm.store.profiles, cold.store.profiles)
+        self.assertEqual([node.alignment for node in warm.get_data()], [node.alignment for node in cold.get_data()])
+
+    def test_invalidation(self):
+        AlignmentParser(self.input, cache=self.cache)
+        cache = AlignmentCache(self.cache)
+
+        # a new modification time with the same content keeps the cache
+        stat = os.stat(self.input)
+        os.utime(self.input, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(cache.read(self.input))
+
+        # and stores the new modification time, so the next read does not hash the input again
+        self.assertEqual(cache.header()['mtime_ns'], stat.st_mtime_ns + 10 ** 9)
+        with mock.patch.object(AlignmentCache, 'content_hash', side_effect=AssertionError('input hashed')):
+            self.assertIsNotNone(cache.read(self.input))
+
+        # the same size but other content does not
+        with open(self.input, 'r+b') as file:
+            file.seek(-2, os.SEEK_END)
+            file.write(b'G')
+        self.assertIsNone(cache.read(self.input))
+
+        parser = AlignmentParser(self.input, cache=self.cache)
+        self.assertEqual(parser.get_data()[-1].alignment[-1], 'G')
+        self.assertIsNotNone(cache.read(self.input))
+
+    def test_corrupt_cache(self):
+        for content in [b'', b'not a cache', AlignmentCache.MAGIC + b'\x10']:
+            with open(self.cache, 'wb') as file:
+                file.write(content)
+            self.assertIsNone(AlignmentCache(self.cache).read(self.input))
+
+        AlignmentParser(self.input, cache=self.cache)
+        with open(self.cache, 'r+b') as file:
+            file.truncate(os.path.getsize(self.cache) - 8)
+        self.assertIsNone(AlignmentCache(self.cache).read(self.input))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from classes import *
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for name in ('test-small', 'fasttree-input', 'adjusted-input'):
+            shutil.copy(f'./resources/{name}.aln', self.directory)
+        with open(os.path.join(self.directory, 'broken.aln'), 'w') as file:
+            file.write('>a\nACGT\n>b\nAC\n')
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as file:
+            file.write('not an alignment')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_inputs(self):
+        paths = batch_inputs(self.directory)
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['adjusted-input.aln', 'broken.aln', 'fasttree-input.aln', 'test-small.aln'])
+
+        manifest = os.path.join(self.directory, 'manifest.txt')
+        with open(manifest, 'w') as file:
+            file.write('# families\ntest-small.aln\n\nfasttree-input.aln\n')
+        self.assertEqual(batch_inputs(manifest), [os.path.join(self.directory, 'test-small.aln'),
+                                                  os.path.join(self.directory, 'fasttree-input.aln')])
+
+    def test_output_names(self):
+        manifest = os.path.join(self.directory, 'manifest.txt')
+        with open(manifest, 'w') as file:
+            file.write('a/x.aln\nb/x.aln\ntest-small.aln\n')
+        paths = batch_inputs(manifest)
+        self.assertEqual(output_names(paths, manifest), [os.path.join('a', 'x.out'), os.path.join('b', 'x.out'),
+                                                         'test-small.out'])
+        self.assertEqual(output_names(batch_inputs(self.directory), self.directory),
+                         ['adjusted-input.out', 'broken.out', 'fasttree-input.out', 'test-small.out'])
+
+        # alignments outside the directory of the manifest are named after their file, and may not collide
+        outside = [os.path.join(self.directory, 'test-small.aln'),
+                   os.path.join(tempfile.gettempdir(), 'test-small.aln')]
+        with self.assertRaises(ValueError):
+            output_names(outside, manifest)
+
+    def test_build_batch(self):
+        paths = batch_inputs(self.directory)
+        expected = {}
+        for path in paths[:1] + paths[2:]:
+            file = io.StringIO()
+            build_tree(path).write_newick(file)
+            expected[path] = file.getvalue()
+
+        # the pool returns the same trees as building them one by one, the broken input is reported, not raised
+        for workers in (1, 2):
+            results = {result.path: result for result in build_batch(paths, workers=workers, pending=2)}
+            self.assertEqual(set(results), set(paths))
+            self.assertIn('length', results[paths[1]].error)
+            self.assertIsNone(results[paths[1]].newick)
+            for path, newick in expected.items():
+                self.assertIsNone(results[path].error)
+                self.assertEqual(results[path].newick, newick)
+                self.assertGreater(results[path].seconds, 0)
+            self.assertEqual(results[paths[3]].leaves, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
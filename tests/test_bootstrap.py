@@ -0,0 +1,63 @@
+from unittest import TestCase
+import numpy as np
+from classes import *
+
+
+class TestBootstrap(TestCase):
+
+    def test_independent_of_workers(self) -> None:
+        rng = np.random.default_rng(0)
+        profiles = rng.random((12, 4, 40))
+        quartets = np.array([rng.choice(12, 4, replace=False) for _ in range(9)])
+
+        serial = bootstrap_support(profiles, quartets, 20, np.random.SeedSequence(3))
+        parallel = bootstrap_support(profiles, quartets, 20, np.random.SeedSequence(3), workers=2)
+        np.testing.assert_array_equal(serial, parallel)
+        self.assertTrue(((0 <= serial) & (serial <= 1)).all())
+
+    def test_replicate_weights(self) -> None:
+        rng = np.random.default_rng(1)
+        subsample = replicate_weights(rng, 7, 50)
+        self.assertEqual(subsample.shape, (7, 50))
+        self.assertTrue((subsample.sum(axis=1) == 10).all() and set(np.unique(subsample)) == {0, 1})
+
+        resample = replicate_weights(rng, 7, 50, 'resample')
+        self.assertTrue((resample.sum(axis=1) == 50).all() and (resample >= 0).all())
+
+        with self.assertRaises(ValueError):
+            replicate_weights(rng, 1, 50, 'jackknife')
+
+    def test_weighted_distances(self) -> None:
+        # a weight row gives the same distance as repeating the columns it counts
+        rng = np.random.default_rng(2)
+        profile_1, profile_2 = rng.random((2, 4, 30))
+        weights = replicate_weights(rng, 1, 30, 'resample')[0]
+        columns = np.repeat(np.arange(30), weights.astype(int))
+
+        contribution = np.abs(profile_1 - profile_2).sum(axis=0)
+        self.assertAlmostEqual(weights @ contribution / (4 * weights.sum()),
+                               Distances.profile_distance(profile_1[:, columns], profile_2[:, columns]))
+
+    def test_compact_support(self) -> None:
+        full = AlignmentParser("./resources/fasttree-input.aln")
+        compact = AlignmentParser("./resources/fasttree-input.aln", compact=True)
+        quartets = np.array([[0, 1, 2, 3], [4, 9, 14, 19], [3, 7, 11, 15]])
+
+        for scheme in SCHEMES:
+            expected = bootstrap_support(full.store.profiles, quartets, 50, np.random.SeedSequence(5), scheme=scheme)
+            actual = bootstrap_support(compact.store.profiles, quartets, 50, np.random.SeedSequence(5), scheme=scheme,
+                                       patterns=compact.store.patterns)
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_tree_bootstrap_seeded(self) -> None:
+        supports = []
+        for _ in range(2):
+            nodes = AlignmentParser("./resources/test-small.aln").get_data()
+            tree = Tree(nodes, 3, len(nodes), bootstrap_round=30)
+            tree.set_top_hits()
+            tree.construct_initial_topology()
+            tree.bootstrap(seed=11, scheme='resample')
+            supports.append([node.support_value for node in tree.nodes if not node.is_leaf])
+
+        self.assertEqual(supports[0], supports[1])
+        self.assertTrue(any(supports[0]))
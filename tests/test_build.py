@@ -0,0 +1,66 @@
+import io
+import unittest
+import numpy as np
+from classes import *
+
+
+class TestBuildTree(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.path = "./resources/fasttree-input.aln"
+        with open(self.path, 'rb') as file:
+            self.records = [(name, sequence.decode()) for name, sequence in AlignmentParser.records(file)]
+        self.expected = build_tree(self.path).to_newick()
+
+    def test_inputs(self):
+        with open(self.path, 'rb') as file:
+            self.assertEqual(build_tree(file).to_newick(), self.expected)
+        with open(self.path) as file:
+            self.assertEqual(build_tree(file).to_newick(), self.expected)
+        self.assertEqual(build_tree(dict(self.records)).to_newick(), self.expected)
+        self.assertEqual(build_tree(self.records).to_newick(), self.expected)
+
+    def test_arrays(self):
+        # arrays carry no names, the leaves are named by their row
+        expected = build_tree([(str(i), sequence) for i, (_, sequence) in enumerate(self.records)]).to_newick()
+
+        codes = np.array([encode(sequence) for _, sequence in self.records])
+        characters = np.array([list(sequence) for _, sequence in self.records])
+        self.assertEqual(build_tree(codes).to_newick(), expected)
+        self.assertEqual(build_tree(characters).to_newick(), expected)
+        for row in range(len(self.records)):
+            self.assertIn(f'{row}:', expected)
+
+    def test_options(self):
+        options = BuildOptions(m=3, nni_rounds=0, bootstrap_rounds=10, seed=1, compact=True)
+        tree = build_tree(io.BytesIO(open(self.path, 'rb').read()), options)
+        self.assertEqual(tree.m, 3)
+        self.assertEqual(tree.switches, 0)
+        self.assertTrue(any(0 < node.support_value <= 1 for node in tree.nodes))
+
+    def test_profiler(self):
+        # a profiler of its own times the phases of the build, without wrapping the Distances methods
+        function = Distances.profile_distance
+        timer = Profiler()
+        timer.enable(distances=False)
+        tree = build_tree(self.path, profiler=timer)
+        self.assertIs(Distances.profile_distance, function)
+        self.assertEqual(tree.to_newick(), self.expected)
+        self.assertEqual(list(timer.phases), ['parse', 'total profile', 'top hits', 'initial topology', 'nni',
+                                              'branch lengths'])
+        self.assertEqual(timer.summary()['distances'], {})
+        self.assertEqual(profiler.phases, {})
+
+    def test_three_leaves(self):
+        tree = build_tree({'a': 'ACGTAC', 'b': 'ACGTTC', 'c': 'TCGTAA'}, BuildOptions(bootstrap_rounds=10, seed=1))
+        self.assertEqual(sorted(node.name for node in tree.nodes if node.is_leaf), ['a', 'b', 'c'])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            build_tree([('a', 'ACGT'), ('b', 'ACG')])
+        with self.assertRaises(ValueError):
+            build_tree(np.full((3, 4), 7, dtype=np.uint8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from classes import *
+
+
+def newick(alignment, options: BuildOptions, name: str = None, context: BuildContext = None) -> str:
+    file = io.StringIO()
+    build_tree(alignment, options, context or BuildContext(name, options.seed)).write_newick(file)
+    return file.getvalue()
+
+
+class TestConcurrentBuilds(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(7)
+        self.jobs = [(f'./resources/{name}.aln', BuildOptions(bootstrap_rounds=20, seed=i))
+                     for i, name in enumerate(('test-small', 'fasttree-input', 'adjusted-input'))]
+        self.jobs.append(('./resources/fasttree-input.aln', BuildOptions(compact=True, single=True, m=3)))
+
+        # random alignments that share a common ancestor, so their trees have some structure
+        for i, N in enumerate((30, 60, 90)):
+            ancestor = rng.integers(0, 4, 200)
+            codes = np.where(rng.random((N, 200)) < 0.2, rng.integers(0, 4, (N, 200)), ancestor).astype(np.uint8)
+            self.jobs.append((codes, BuildOptions(bootstrap_rounds=10, resample=True, seed=100 + i)))
+
+    def test_threads_match_serial(self):
+        expected = [newick(alignment, options) for alignment, options in self.jobs]
+
+        # every build several times, in a shuffled order, with more threads than cores
+        order = list(range(len(self.jobs))) * 4
+        random.Random(0).shuffle(order)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: newick(*self.jobs[i], name=f'job{i}'), order))
+
+        for i, result in zip(order, results):
+            self.assertEqual(result, expected[i])
+
+    def test_context(self):
+        # without a seed in the options the bootstrap draws from the seed of the context
+        options = BuildOptions(bootstrap_rounds=10)
+        same = [newick('./resources/fasttree-input.aln', options, context=BuildContext(seed=5)) for _ in range(2)]
+        other = newick('./resources/fasttree-input.aln', options, context=BuildContext(seed=6))
+        self.assertEqual(same[0], same[1])
+        self.assertNotEqual(same[0], other)
+
+        # the logger tags the messages with the name of the build
+        with self.assertLogs('FastTree', 'INFO') as logs:
+            build_tree('./resources/test-small.aln', context=BuildContext('small'))
+        self.assertTrue(logs.output)
+        self.assertTrue(all('[small] ' in line for line in logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
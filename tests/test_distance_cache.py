@@ -0,0 +1,59 @@
+from unittest import TestCase
+from classes import *
+
+
+class TestOutDistanceCache(TestCase):
+
+    def test_invalidated_by_join(self) -> None:
+        nodes = AlignmentParser("./resources/test-small.aln").get_data()
+        tree = Tree(nodes, 3, len(nodes))
+        cache = OutDistanceCache()
+        A, B, C = nodes[:3]
+
+        expected = Distances.total_profile_out_distance(C, tree.tp, tree.active_nodes)
+        self.assertEqual(cache.out_distance(C, tree.tp, tree.active_nodes), expected)
+        self.assertEqual(cache.out_distance(C, tree.tp, tree.active_nodes), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        tree.set_top_hits()
+        tree.join_nodes(A, B)
+        expected = Distances.total_profile_out_distance(C, tree.tp, tree.active_nodes)
+        self.assertEqual(cache.out_distance(C, tree.tp, tree.active_nodes), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertAlmostEqual(cache.hit_rate, 1 / 3)
+
+    def test_tree_uses_cache(self) -> None:
+        nodes = AlignmentParser("./resources/test-small.aln").get_data()
+        tree = Tree(nodes, 3, len(nodes))
+        tree.set_top_hits()
+
+        self.assertEqual(tree.out_distances.misses, len(nodes))
+        self.assertTrue(tree.out_distances.hits > 0)
+
+
+class TestLogDistanceCache(TestCase):
+
+    def test_hits_and_versions(self) -> None:
+        A, B, C = Node("A", "ACGTAC"), Node("B", "ACGTTT"), Node("C", "AAGTTT")
+        cache = LogDistanceCache()
+
+        d_ab = cache.distance(A, B)
+        self.assertAlmostEqual(d_ab, Distances.log_corrected_profile_distance(A.profile, B.profile))
+        self.assertEqual(cache.distance(B, A), d_ab)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # a rewritten profile is computed again
+        A.profile = C.profile
+        self.assertAlmostEqual(cache.distance(A, B), Distances.log_corrected_profile_distance(C.profile, B.profile))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_eviction(self) -> None:
+        nodes = [Node(str(i), sequence) for i, sequence in enumerate(["AAAA", "AAAT", "AATT", "ATTT"])]
+        cache = LogDistanceCache(capacity=2)
+
+        cache.distances(nodes[:3], nodes[1:])
+        self.assertEqual(len(cache), 2)
+
+        # the least recently used pair was dropped
+        cache.distance(nodes[0], nodes[1])
+        self.assertEqual(cache.misses, 4)
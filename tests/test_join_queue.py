@@ -0,0 +1,34 @@
+from unittest import TestCase
+from classes import *
+
+
+class TestJoinQueue(TestCase):
+
+    def test_lazy_invalidation(self) -> None:
+        nodes = [Node(name, "ACGT") for name in "ABCD"]
+        for node, distance in zip(nodes, [0.4, 0.1, 0.3, 0.2]):
+            node.best_known.distance = distance
+        A, B, C, D = nodes
+
+        queue = JoinQueue(nodes)
+
+        # B moves to the back, its old entry at the front is stale
+        B.best_known.distance = 0.9
+        queue.push(B)
+        # C is joined away and is skipped
+        C.is_active = False
+
+        self.assertEqual(queue.pop(), D)
+        self.assertEqual(queue.pop(), A)
+        self.assertEqual(queue.pop(), B)
+        self.assertIsNone(queue.pop())
+
+    def test_construct_initial_topology(self) -> None:
+        nodes = AlignmentParser("./resources/test-small.aln").get_data()
+        tree = Tree(nodes, 3, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        self.assertEqual(len(tree.root.leaves()), len(nodes))
+        self.assertEqual(tree.joins, len(nodes) - 1)
+        self.assertIsNone(tree.join_queue)
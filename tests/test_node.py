@@ -1,4 +1,5 @@
 from unittest import TestCase
+from queue import PriorityQueue
 from classes import *
 
 
@@ -0,0 +1,41 @@
+from unittest import TestCase
+import numpy as np
+from classes import *
+
+
+class TestProfileStore(TestCase):
+
+    def test_join_in_place(self) -> None:
+        A = Node("A", "ATCGCG")
+        B = Node("B", "ATCGAA")
+        C = Node("C", "ATCGGG")
+        A.top_hits = {}
+        B.top_hits = {}
+        C.top_hits = {}
+
+        tree = Tree([A, B, C], 1, 3)
+        tree.set_total_profile(TotalProfile([A, B, C]))
+        self.assertEqual(tree.store.capacity, 5)
+        self.assertTrue(A.store is tree.store and C.store is tree.store)
+
+        block = tree.store.profiles
+        AB = tree.join_nodes(A, B)
+
+        # the joined profile lives in the preallocated block, no new array was created
+        self.assertTrue(tree.store.profiles is block)
+        self.assertTrue(np.shares_memory(AB.profile, block))
+        np.testing.assert_array_equal(AB.profile, Node.join_profiles(A.profile, B.profile))
+
+    def test_parser_store_is_reused(self) -> None:
+        parser = AlignmentParser("./resources/test-small.aln", np.float32)
+        nodes = parser.get_data()
+        tree = Tree(nodes, 3, len(nodes))
+
+        self.assertTrue(tree.store is parser.store)
+        self.assertEqual(tree.store.profiles.shape, (15, 4, 31))
+        self.assertEqual(nodes[0].profile.dtype, np.float32)
+
+    def test_full_store(self) -> None:
+        store = ProfileStore(1, 4)
+        store.add(np.zeros((4, 4)))
+        self.assertRaises(IndexError, store.allocate)
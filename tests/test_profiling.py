@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from classes import *
+
+
+class TestProfiler(unittest.TestCase):
+
+    def build(self) -> Tree:
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+        return tree
+
+    def test_disabled(self):
+        profiler = Profiler()
+        function = Distances.profile_distance
+        with profiler.phase('build'):
+            self.build()
+
+        # nothing is wrapped or recorded while disabled
+        self.assertIs(Distances.profile_distance, function)
+        self.assertEqual(profiler.summary(), {'phases': {}, 'counters': {}, 'distances': {}})
+
+    def test_counters(self):
+        profiler = Profiler()
+        function = Distances.profile_distance
+        expected = self.build().to_newick()
+
+        profiler.enable()
+        try:
+            self.assertIsNot(Distances.profile_distance, function)
+            with profiler.phase('build'):
+                tree = self.build()
+        finally:
+            profiler.disable()
+        self.assertIs(Distances.profile_distance, function)
+
+        # the instrumented run builds the same tree
+        self.assertEqual(tree.to_newick(), expected)
+        profiler.count(joins=tree.joins, recomputes=tree.tp.recomputes)
+        summary = profiler.summary()
+        self.assertGreater(summary['phases']['build'], 0)
+        self.assertEqual(summary['counters'], {'joins': 23, 'recomputes': 1})
+        calls = summary['distances']['neighbor_join_distances']
+        self.assertGreater(calls['calls'], 0)
+        self.assertEqual(calls['columns'] % tree.L, 0)
+
+        file = io.StringIO()
+        profiler.report(file)
+        self.assertIn('neighbor_join_distances', file.getvalue())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            profiler.write_json(path)
+            with open(path) as handle:
+                self.assertEqual(json.load(handle), json.loads(json.dumps(summary)))
+
+
+    def test_cached_columns(self):
+        profiler = Profiler()
+        leaves = [Node("A", "ATCGCG"), Node("B", "ATCGAA")]
+        tree = Tree(leaves, 1, 2)
+        joined = tree.join_nodes(*leaves)
+        # rewriting the profile drops the up-distance the join cached
+        joined.recompute_profile()
+
+        profiler.enable()
+        try:
+            for _ in range(3):
+                Distances.up_distance(joined)
+            Distances.up_distance(leaves[0])
+        finally:
+            profiler.disable()
+
+        # only the first call of the joined node computes its up-distance, the others read it from the store
+        calls = profiler.summary()['distances']['up_distance']
+        self.assertEqual(calls, {'calls': 4, 'columns': 6})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from unittest import TestCase
+import numpy as np
+from classes import *
+
+
+class TestTotalProfile(TestCase):
+
+    def setUp(self) -> None:
+        nodes = AlignmentParser("./resources/test-small.aln").get_data()
+        self.tree = Tree(nodes, 3, len(nodes))
+
+    def assert_matches_recompute(self, tp: TotalProfile) -> None:
+        fresh = TotalProfile(list(self.tree.active_nodes))
+        self.assertEqual(tp.active, fresh.active)
+        np.testing.assert_allclose(tp.total_profile, fresh.total_profile, atol=1e-12)
+        self.assertAlmostEqual(tp.up_distance_sum, fresh.up_distance_sum, places=12)
+        self.assertAlmostEqual(tp.up_distance_sum,
+                               sum(Distances.up_distance(node) for node in self.tree.active_nodes), places=12)
+
+    def test_on_join(self) -> None:
+        tree = self.tree
+        nodes = list(tree.active_nodes)
+        tree.set_top_hits()
+
+        tree.join_nodes(nodes[0], nodes[1])
+        tree.join_nodes(nodes[2], nodes[3])
+        AB = tree.join_nodes(nodes[4], nodes[5])
+        tree.join_nodes(AB, nodes[6])
+        self.assert_matches_recompute(tree.tp)
+
+    def test_set_total_profile(self) -> None:
+        # a total profile built from a plain list follows the active set once it is set on the tree
+        tree = self.tree
+        nodes = list(tree.active_nodes)
+        tree.set_total_profile(TotalProfile(nodes, recompute_interval=3))
+        tree.set_top_hits()
+
+        AB = tree.join_nodes(nodes[0], nodes[1])
+        tree.join_nodes(nodes[2], nodes[3])
+        tree.join_nodes(AB, nodes[4])
+        self.assertEqual(tree.tp.updates, 0)
+        self.assertEqual(tree.tp.active, len(tree.active_nodes))
+        self.assert_matches_recompute(tree.tp)
+
+    def test_periodic_recompute(self) -> None:
+        tree = self.tree
+        tree.tp.recompute_interval = 2
+        nodes = list(tree.active_nodes)
+        tree.set_top_hits()
+
+        tree.join_nodes(nodes[0], nodes[1])
+        self.assertEqual(tree.tp.updates, 1)
+        tree.join_nodes(nodes[2], nodes[3])
+        self.assertEqual(tree.tp.updates, 0)
+        self.assert_matches_recompute(tree.tp)
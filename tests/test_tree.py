@@ -1,4 +1,7 @@
 from unittest import TestCase
+import io
+from unittest import mock
+import numpy as np
 from classes import *
 
 
@@ -7,18 +10,98 @@ class TestTree(TestCase):
     def test_join_nodes(self):
         node_1 = Node("A", "ATCGCG")
         node_2 = Node("C", "ATCGAA")
-        nodes = [node_1, node_2]
-        N = len(nodes)
-        m = round(math.sqrt(N))
-        tree = Tree(nodes, m, N)
+        node_3 = Node("G", "ATCGGG")
+        node_4 = Node("T", "TTCGTA")
+        nodes = [node_1, node_2, node_3, node_4]
+        tree = Tree(nodes, 2, len(nodes))
         tree.set_top_hits()
         new_node = tree.join_nodes(node_1, node_2)
 
         # assert name join
         self.assertEqual(new_node.name, "AC")
-        # assert top hits set
-        self.assertTrue(len(new_node.top_hits) > 0)
+        # the top hits of the joined node are the other active nodes, never itself or its children
+        self.assertCountEqual(new_node.top_hits, [node_3, node_4])
+        for node, distance in new_node.top_hits.items():
+            self.assertEqual(distance, tree.neighbor_join_distance(new_node, node))
 
+    def test_join_best_known(self):
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+
+        # without top hits the joined node falls back to the closest of all active nodes
+        with mock.patch.object(tree, 'set_top_hits_node'):
+            new_node = tree.join_nodes(nodes[0], nodes[1])
+        others = [node for node in tree.active_nodes if node != new_node]
+        distances = [tree.neighbor_join_distance(new_node, node) for node in others]
+        self.assertIs(new_node.best_known.node, others[int(np.argmin(distances))])
+        self.assertEqual(new_node.best_known.distance, min(distances))
+
+    def test_join_bookkeeping(self):
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        join_nodes = tree.join_nodes
+
+        # after every join the best known joins and the top hits of the active nodes only point at active nodes
+        def checked_join(node_1, node_2):
+            joined_node = join_nodes(node_1, node_2)
+            for node in tree.active_nodes:
+                if len(tree.active_nodes) > 1:
+                    self.assertIn(node.best_known.node, tree.active_nodes)
+                self.assertTrue(all(hit in tree.active_nodes for hit in node.top_hits))
+            return joined_node
+
+        with mock.patch.object(tree, 'join_nodes', side_effect=checked_join):
+            tree.construct_initial_topology()
+        self.assertEqual(tree.joins, len(nodes) - 1)
+
+    def test_join_replaces_top_hits(self):
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        node_1 = nodes[0]
+        node_2 = next(iter(node_1.top_hits))
+        holders = [node for node in nodes if node_1 in node.top_hits or node_2 in node.top_hits]
+        new_node = tree.join_nodes(node_1, node_2)
+
+        # every list that held one of the joined nodes holds their parent instead, and stays at most m long
+        for node in holders:
+            if node.is_active:
+                self.assertIn(new_node, node.top_hits)
+                self.assertLessEqual(len(node.top_hits), 5)
+                self.assertNotIn(node_1, node.top_hits)
+                self.assertNotIn(node_2, node.top_hits)
+
+    def test_seed_top_hits(self):
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+
+        # every leaf has a full list of top hits, but only the seeds were compared to all other leaves
+        self.assertTrue(all(len(node.top_hits) == 5 and node not in node.top_hits for node in nodes))
+        self.assertLess(tree.seeds, len(nodes) / 2)
+
+        # without close neighbors every leaf is a seed, the seed's own top hits are exact either way
+        exact = Tree(AlignmentParser("./resources/fasttree-input.aln").get_data(), 5, len(nodes), close_ratio=0)
+        exact.set_top_hits()
+        self.assertEqual(exact.seeds, len(nodes))
+        self.assertEqual([n.name for n in nodes[0].top_hits], [n.name for n in exact.nodes[0].top_hits])
+
+    def test_refresh_top_hits(self):
+        refreshes = []
+        for refresh_ratio in (0, 0.8, 1):
+            nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+            tree = Tree(nodes, 5, len(nodes), refresh_ratio=refresh_ratio)
+            tree.set_top_hits()
+            tree.construct_initial_topology()
+            refreshes.append(tree.refreshes)
+
+        # a joined node is compared to all active nodes more often the more active top hits it asks for, but always
+        # when none of the top hits of its children are active
+        self.assertEqual(refreshes, sorted(refreshes))
+        self.assertLess(refreshes[0], refreshes[-1])
+        self.assertGreater(refreshes[0], 0)
 
     def test_tree_topology(self) -> None:
         # testing some basic tree structures
@@ -30,8 +113,9 @@ class TestTree(TestCase):
         tree.set_top_hits()
         tree.construct_initial_topology()
 
-        self.assertEqual(tree.root.name, "ABC")
-        self.assertEqual([i.name for i in tree.root.children], ['C', 'AB'])
+        # serializing the tree no longer reorders the children, so only the split is fixed
+        self.assertCountEqual([leaf.name for leaf in tree.root.leaves()], ['A', 'B', 'C'])
+        self.assertCountEqual([i.name for i in tree.root.children], ['C', 'AB'])
         self.assertEqual(A.get_sibling(), B)
 
 
@@ -62,8 +146,145 @@ class TestTree(TestCase):
         tree.set_top_hits()
 
         tree.construct_initial_topology()
-        tree.switch_nodes(D,C)
 
+        # the identical sequences are joined directly
+        self.assertEqual(E.get_sibling(), D)
+
+        tree.switch_nodes(D,C)
         tree.nearest_neighbor_interchange()
 
-        self.assertEqual(E.get_sibling(), D)
\ No newline at end of file
+        # the interchanges keep a binary tree over all leaves
+        self.assertEqual(sorted(leaf.name for leaf in tree.root.leaves()), ['A', 'B', 'C', 'D', 'D'])
+        self.assertTrue(all(len(node.children) == 2 for node in tree.nodes if not node.is_leaf))
+
+    def test_nni_rounds(self) -> None:
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        statistics = tree.nearest_neighbor_interchanges(10)
+
+        # the rounds stop at the first round without a switch
+        self.assertLess(len(statistics), 10)
+        self.assertEqual(statistics[-1][0], 0)
+        self.assertTrue(all(switches for switches, _ in statistics[:-1]))
+        self.assertEqual(sorted(leaf.name for leaf in tree.root.leaves()), sorted(node.name for node in nodes))
+
+        # a round over the remaining dirty nodes of a settled tree changes nothing
+        self.assertEqual(tree.nearest_neighbor_interchange(set()), (0, set()))
+
+    def test_stale_profiles(self) -> None:
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        a = next(node for node in tree.nodes if tree.depth(node) >= 3)
+        tree.switch_nodes(a.get_sibling(), a.parent.get_sibling())
+
+        # the switch only marks the paths to the root, reading a profile rebuilds what is below it
+        self.assertTrue(a.parent.stale and tree.root.stale)
+        tree.root.profile
+        self.assertFalse(any(node.stale for node in tree.nodes))
+
+        for node in tree.nodes:
+            if node.children:
+                expected = np.mean([child.profile for child in node.children], axis=0)
+                np.testing.assert_allclose(node.profile, expected)
+                self.assertAlmostEqual(Distances.up_distance(node), Distances.profile_distance(
+                    node.children[0].profile, node.children[-1].profile) / 2)
+
+    def test_neighbourhood(self) -> None:
+        A, B, C, D = Node("A", "AAAA"), Node("B", "AAAT"), Node("C", "AATT"), Node("D", "ATTT")
+        tree = Tree([A, B, C, D], 2, 4)
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        self.assertEqual(tree.neighbourhood([A], 0), {A})
+        self.assertEqual(tree.neighbourhood([A], 1), {A, A.parent})
+        self.assertTrue({A, A.parent, A.get_sibling()} <= tree.neighbourhood([A], 2))
+        self.assertEqual(tree.neighbourhood([A], 10), set(tree.nodes))
+
+    def test_depths(self) -> None:
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        depths = tree.depths(tree.root)
+        self.assertEqual(set(depths), set(tree.nodes))
+        self.assertEqual(depths, {node: tree.depth(node) for node in tree.nodes})
+
+    def test_newick_deep_tree(self) -> None:
+        # a caterpillar far deeper than the recursion limit
+        store = ProfileStore.for_leaves(3000, 4)
+        nodes = [Node(str(i), "ACGT", store=store) for i in range(3000)]
+        root = nodes[0]
+        for node in nodes[1:]:
+            parent = Node("", "", is_leaf=False, store=store)
+            parent.add_child(root)
+            parent.add_child(node)
+            root = parent
+
+        newick = root.newick()
+        self.assertTrue(newick.startswith("(2999:1,(2998:1,"))
+        self.assertEqual(newick.count("("), 2999)
+        self.assertEqual([child.is_leaf for child in root.children], [False, True])
+
+        tree = Tree(nodes[:2], 1, 2)
+        tree.root = root
+        file = io.StringIO()
+        tree.write_newick(file, chunk_size=100)
+        self.assertEqual(file.getvalue(), tree.to_newick())
+        self.assertEqual(file.getvalue(), newick + ";")
+
+    def test_branch_lengths(self) -> None:
+        nodes = AlignmentParser("./resources/fasttree-input.aln").get_data()
+        tree = Tree(nodes, 5, len(nodes))
+        tree.set_top_hits()
+        tree.construct_initial_topology()
+
+        # the former node by node computation, in both orders of the nodes so the negative length is moved once
+        # to a target that comes before it and once to a target that comes after it
+        for order in range(2):
+            if order:
+                tree.nodes.reverse()
+
+            r = tree.root
+            expected = {}
+            for node in tree.nodes:
+                if node == r:
+                    expected[node] = 0
+                    continue
+                if node.is_leaf:
+                    a, b = node, node.get_sibling()
+                    d_ar, d_ab, d_br = [Distances.log_corrected_profile_distance(x.profile, y.profile)
+                                        for x, y in [(a, r), (a, b), (b, r)]]
+                    expected[node] = (d_ar + d_ab - d_br) / 2
+                    target = b
+                else:
+                    a, b, c = node.children[0], node.children[1], node.get_sibling()
+                    pairs = [(a, r), (a, c), (b, r), (b, c), (a, b), (r, c)]
+                    d_ar, d_ac, d_br, d_bc, d_ab, d_rc = [
+                        Distances.log_corrected_profile_distance(x.profile, y.profile) for x, y in pairs]
+                    expected[node] = (d_ar + d_ac + d_br + d_bc) / 4 - (d_ab + d_rc) / 2
+                    target = c
+                if expected[node] < 0:
+                    expected[target] = expected.get(target, 0) - expected[node]
+                    expected[node] = 0
+
+            tree.calculate_branch_length()
+            self.assertTrue(any(length > 0 for length in expected.values()))
+            for node in tree.nodes:
+                self.assertAlmostEqual(node.branch_length, expected[node], places=12)
+                # lengths that were set to zero are written as 0, not 0.0
+                self.assertIs(type(node.branch_length), type(expected[node]))
+            self.assertTrue(tree.to_newick().endswith(':0;'))
+
+    def test_closest(self) -> None:
+        distances = np.array([0.5, 0.1, 0.3, 0.1, 0.3, 0.9])
+
+        self.assertEqual(list(Tree.closest(distances, 3)), [1, 3, 2])
+        self.assertEqual(list(Tree.closest(distances, 4)), [1, 3, 2, 4])
+        self.assertEqual(list(Tree.closest(distances, 10)), [1, 3, 2, 4, 0, 5])